@@ -0,0 +1,251 @@
+import time
+import asyncio
+import threading
+import aiohttp
+import requests
+from concurrent.futures import Future, wait
+from typing import Any, Callable, Dict, Optional
+from http_session import IDEMPOTENT_METHODS, RETRY_STATUSES
+
+# Errors raised before the request reached the server; a GET that did reach it may have handed out work
+CONNECT_ERRORS = (aiohttp.ClientConnectorError, getattr(aiohttp, 'ConnectionTimeoutError', aiohttp.ClientConnectorError))
+
+
+class AsyncBackendClient:
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, retries: int = 3, backoff_factor: float = 0.5,
+                 recorder: Optional[Callable[[str, str, float, bool], None]] = None) -> None:
+        """
+        Initialize an asyncio client for the backend API, built on a pooled aiohttp session.
+
+        The session is created on first use, inside the event loop that runs the requests.
+
+        :param base_url: Base URL of the API.
+        :param pool_size: Maximum number of concurrent connections.
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait for the server between two reads of the response.
+        :param retries: Number of retries of a failed GET request.
+        :param backoff_factor: Base of the exponential backoff between retries, in seconds.
+        :param recorder: Optional callable receiving the method, URL, seconds and failure of every request, such
+            as DriverSession.record, so these requests show up in the same metrics as the synchronous ones.
+        """
+        self.url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'AsyncBackendClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+    @staticmethod
+    def read_files(data):
+        """
+        Reads the file objects of a requests-style `files` argument into bytes.
+
+        Requests running on the event loop can't rely on the caller keeping its files open until they are sent.
+
+        :param data: A dictionary or list of (field, file) pairs, where file is a file object or a
+            (filename, file object[, content type]) tuple.
+        :return: The same pairs as a list, with (filename, bytes[, content type]) tuples.
+        """
+        files = []
+        for field, value in (data.items() if isinstance(data, dict) else data):
+            if not isinstance(value, tuple):
+                value = (getattr(value, 'name', field), value)
+            content = value[1].read() if hasattr(value[1], 'read') else value[1]
+            files.append((field, (value[0], content, *value[2:])))
+        return files
+
+    @staticmethod
+    def _form(data) -> aiohttp.FormData:
+        """
+        Builds multipart form data from a requests-style `files` argument.
+
+        :param data: A dictionary or list of (field, file) pairs, where file is a file object or a
+            (filename, file object[, content type]) tuple.
+        :return: The form data.
+        """
+        form = aiohttp.FormData()
+        for field, value in (data.items() if isinstance(data, dict) else data):
+            if isinstance(value, tuple):
+                filename, content = value[0], value[1]
+                content_type = value[2] if len(value) > 2 else None
+            else:
+                filename, content, content_type = getattr(value, 'name', field), value, None
+            form.add_field(field, content, filename=filename, content_type=content_type)
+        return form
+
+    async def send_http_request(self, request_type: str, path: str, data: Optional[Dict[str, Any]] = None,
+                                files: bool = False) -> Dict[str, Any]:
+        """
+        Sends an HTTP request to the API and returns its JSON response, like Driver.send_http_request.
+
+        GET requests, being in the session's IDEMPOTENT_METHODS, are retried with exponential backoff when the
+        connection can't be established and on the statuses in RETRY_STATUSES; a GET whose response was lost
+        isn't replayed, since it may have handed out work.
+
+        :param request_type: The type of HTTP request ('get' or 'post').
+        :param path: The path to append to the base URL.
+        :param data: The data to send with a POST request.
+        :param files: Whether the data is a dictionary of files to send as multipart form data.
+        :return: The JSON response from the server.
+        :raises ValueError: If an unsupported request type is provided or the response is not JSON.
+        :raises aiohttp.ClientResponseError: If the server responds with an error status.
+        :raises aiohttp.ClientError: For other errors in the HTTP request.
+        """
+        method = request_type.upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported request type: {request_type}")
+        url = f'{self.url}/{path}'
+        start = time.perf_counter()
+        try:
+            response = await self._send(method, url, data, files)
+        except Exception:
+            if self.recorder is not None:
+                self.recorder(method, url, time.perf_counter() - start, True)
+            raise
+        if self.recorder is not None:
+            self.recorder(method, url, time.perf_counter() - start, False)
+        return response
+
+    async def _send(self, method: str, url: str, data, files: bool) -> Dict[str, Any]:
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+
+        for attempt in range(retries + 1):
+            try:
+                if method == 'POST':
+                    kwargs = {'data': self._form(data)} if files else {'json': data}
+                    response = await self._session().post(url, **kwargs)
+                else:
+                    response = await self._session().get(url)
+                async with response:
+                    if response.status in RETRY_STATUSES and attempt < retries:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status, message=response.reason)
+                    response.raise_for_status()
+                    try:
+                        return await response.json(content_type=None)
+                    except ValueError:
+                        raise ValueError(f"Response from {url} is not in JSON format.")
+            except (*CONNECT_ERRORS, aiohttp.ClientResponseError) as e:
+                status = getattr(e, 'status', None)
+                if attempt >= retries or (status is not None and status not in RETRY_STATUSES):
+                    raise
+                await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def close(self) -> None:
+        """Closes the session and its pooled connections."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class BackendClient:
+    def __init__(self, base_url: str, **options) -> None:
+        """
+        Initialize a synchronous facade over AsyncBackendClient.
+
+        The async client runs on an event loop in a background thread, so blocking callers keep working while
+        fire-and-forget requests from `submit` run concurrently with the browser or video work.
+
+        :param base_url: Base URL of the API.
+        :param options: Keyword arguments for AsyncBackendClient.
+        """
+        self.client = AsyncBackendClient(base_url, **options)
+        # Requests submitted and not finished yet, waited for on close
+        self.pending = set()
+        self._lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='backend-client', daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> 'BackendClient':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def submit(self, request_type: str, path: str, data: Optional[Dict[str, Any]] = None,
+               files: bool = False) -> Future:
+        """
+        Schedules a request without waiting for it.
+
+        The files are read before this returns, so the caller may close them right away.
+
+        :param request_type: The type of HTTP request ('get' or 'post').
+        :param path: The path to append to the base URL.
+        :param data: The data to send with a POST request.
+        :param files: Whether the data is a dictionary of files to send as multipart form data.
+        :return: A future resolving to the JSON response, or to the aiohttp error.
+        """
+        if files:
+            data = self.client.read_files(data)
+        future = asyncio.run_coroutine_threadsafe(
+            self.client.send_http_request(request_type, path, data, files), self.loop
+        )
+        with self._lock:
+            self.pending.add(future)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self.pending.discard(future)
+
+    def send_http_request(self, request_type: str, path: str, data: Optional[Dict[str, Any]] = None,
+                          files: bool = False) -> Dict[str, Any]:
+        """
+        Sends a request and waits for its JSON response.
+
+        Errors are raised as requests exceptions, so callers written against Driver.send_http_request keep
+        handling them the same way.
+
+        :param request_type: The type of HTTP request ('get' or 'post').
+        :param path: The path to append to the base URL.
+        :param data: The data to send with a POST request.
+        :param files: Whether the data is a dictionary of files to send as multipart form data.
+        :return: The JSON response from the server.
+        :raises ValueError: If an unsupported request type is provided or the response is not JSON.
+        :raises requests.HTTPError: If the server responds with an error status.
+        :raises requests.RequestException: For other errors in the HTTP request.
+        """
+        try:
+            return self.submit(request_type, path, data, files).result()
+        except aiohttp.ClientResponseError as e:
+            response = requests.Response()
+            response.status_code = e.status
+            response.reason = e.message
+            response.url = str(e.request_info.real_url)
+            raise requests.HTTPError(f"{e.status} {e.message} for url: {response.url}", response=response) from e
+        except aiohttp.ClientConnectionError as e:
+            raise requests.ConnectionError(str(e)) from e
+        except asyncio.TimeoutError as e:
+            raise requests.Timeout(f"Request to {path} timed out") from e
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for the pending requests, then closes the async client and stops its event loop.
+
+        :param timeout: Optional maximum number of seconds to wait for the pending requests.
+        """
+        if self.loop.is_closed():
+            return
+        with self._lock:
+            pending = list(self.pending)
+        wait(pending, timeout=timeout)
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+import cv2
+import numpy as np
+from typing import Any, Dict, Optional
+from driver import Driver
+from mock_backend import MockBackend
+from video_frame_extractor import VideoFrameExtractor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENES = ('static', 'pan', 'cuts')
+RESOLUTIONS = {'480p': (854, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets the peak resident set size of this process to its current size, so the next stage is measured alone.
+
+    :return: True if it was reset, False where the kernel doesn't support it and peak_rss stays a lifetime peak.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> Optional[int]:
+    """
+    Returns the peak resident set size of this process in bytes since the last reset_peak_rss, or None where
+    it can't be measured.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss can't be reset, so it is the peak of the whole run; it is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def texture(rng: np.random.Generator, width: int, height: int) -> np.ndarray:
+    """
+    Builds a smooth random image with a few sharp shapes, so hashes and JPEG sizes behave like real footage.
+    """
+    image = cv2.resize(rng.integers(0, 255, (9, 16, 3), dtype=np.uint8), (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(8):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.circle(image, center, int(rng.integers(height // 20, height // 4)), color, -1)
+    return image
+
+
+def generate_video(path: str, scene: str, resolution: str, seconds: float, fps: int = 30, seed: int = 0) -> str:
+    """
+    Writes a synthetic test video.
+
+    :param path: The path of the video file.
+    :param scene: 'static' (one scene with sensor noise), 'pan' (a slow horizontal pan) or 'cuts' (a new
+        scene every half second).
+    :param resolution: One of the keys of RESOLUTIONS.
+    :param seconds: The length of the video.
+    :param fps: The frame rate.
+    :param seed: The random seed, so runs are reproducible.
+    :return: The path of the video file.
+    """
+    width, height = RESOLUTIONS[resolution]
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    canvas = texture(rng, width * 2, height)
+    frame = canvas[:, :width]
+    for index in range(int(seconds * fps)):
+        if scene == 'static':
+            noise = rng.integers(-3, 4, frame.shape, dtype=np.int16)
+            writer.write(np.clip(canvas[:, :width] + noise, 0, 255).astype(np.uint8))
+        elif scene == 'pan':
+            offset = int(index * width / (seconds * fps))
+            writer.write(np.ascontiguousarray(canvas[:, offset:offset + width]))
+        else:
+            if index % (fps // 2) == 0:
+                frame = texture(rng, width, height)
+            writer.write(frame)
+    writer.release()
+    return path
+
+
+def run_case(backend: MockBackend, video_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs the download, extract and upload stages of one video against the mock backend and measures each.
+
+    :param backend: The running mock backend serving the video.
+    :param video_path: The synthetic video, inside the backend's files directory.
+    :param options: Keyword arguments for the VideoFrameExtractor.
+    :return: The measurements of each stage.
+    """
+    driver = Driver(backend.url, ship_logs=False)
+    extractor = VideoFrameExtractor(driver, handle=False, **{'hash_store_path': None, **options})
+    capture = cv2.VideoCapture(video_path)
+    source_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+
+    backend.videos.append({'id': 1, 'video': backend.file_url(os.path.basename(video_path)), 'photos_group_id': 'benchmark'})
+    video = driver.send_http_request('GET', 'videos/get')[0]
+    size = os.path.getsize(video_path)
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    downloaded_path = extractor.download_video(video)
+    download_seconds = time.perf_counter() - start
+    download_rss = peak_rss()
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    frames_dir = extractor.extract_frames(downloaded_path, video['photos_group_id'])
+    extract_seconds = time.perf_counter() - start
+    extract_rss = peak_rss()
+    report = extractor.encoding_reports[frames_dir]
+
+    reset_peak_rss()
+    start = time.perf_counter()
+    summary = extractor.upload_frames(frames_dir, video['photos_group_id'])
+    upload_seconds = time.perf_counter() - start
+
+    return {
+        'download': {
+            'seconds': round(download_seconds, 4),
+            'bytes': size,
+            'megabytes_per_second': round(size / download_seconds / 1e6, 2),
+            'peak_rss': download_rss,
+        },
+        'extract': {
+            'seconds': round(extract_seconds, 4),
+            'source_frames': source_frames,
+            'frames_per_second': round(source_frames / extract_seconds, 1),
+            'frames_kept': report['frames'],
+            'bytes_written': report['bytes_written'],
+            'peak_rss': extract_rss,
+        },
+        'upload': {
+            'seconds': round(upload_seconds, 4),
+            'frames_uploaded': summary['uploaded'],
+            'frames_failed': summary['failed'],
+            'bytes': summary['bytes'],
+            'frames_per_second': round(summary['uploaded'] / upload_seconds, 1) if upload_seconds else None,
+            'peak_rss': peak_rss(),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the video frame pipeline on synthetic videos.")
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=SCENES)
+    parser.add_argument('--resolutions', nargs='+', default=['480p', '1080p'], choices=list(RESOLUTIONS))
+    parser.add_argument('--seconds', nargs='+', type=float, default=[5.0, 20.0])
+    parser.add_argument('--options', default='{}', help="VideoFrameExtractor keyword arguments as JSON.")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+    options = json.loads(args.options)
+
+    logging.disable(logging.INFO)
+    workdir = tempfile.mkdtemp(prefix='fmap-benchmark-')
+    videos_dir = os.path.join(workdir, 'videos')
+    os.makedirs(videos_dir)
+    cwd = os.getcwd()
+    # The extractor writes to download/ relative to the working directory
+    os.chdir(workdir)
+    results = []
+    try:
+        with MockBackend(files_dir=videos_dir) as backend:
+            for scene in args.scenes:
+                for resolution in args.resolutions:
+                    for seconds in args.seconds:
+                        name = f"{scene}-{resolution}-{seconds:g}s.mp4"
+                        video_path = generate_video(os.path.join(videos_dir, name), scene, resolution, seconds)
+                        result = run_case(backend, video_path, options)
+                        results.append({'scene': scene, 'resolution': resolution, 'seconds': seconds, **result})
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps({'options': options, 'peak_rss_per_stage': reset_peak_rss(), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+import statistics
+from typing import Any, Dict, List
+from driver import Driver
+from mock_backend import MockBackend
+
+
+def time_download(driver: Driver, url: str, download_path: str, segments: int, min_segment_size: int) -> Dict[str, Any]:
+    """
+    Downloads a URL once, with download for one segment and download_segmented otherwise.
+
+    :param driver: The driver whose downloader and session are used.
+    :param url: The URL of the file.
+    :param download_path: The local path the file is written to; it is removed afterwards.
+    :param segments: The number of connections.
+    :param min_segment_size: The minimum number of bytes per segment.
+    :return: The seconds taken, the checksum and the number of segments actually used.
+    """
+    start = time.perf_counter()
+    if segments > 1:
+        result = driver.downloader.download_segmented(url, download_path, segments, min_segment_size)
+    else:
+        result = driver.downloader.download(url, download_path)
+        result['segments'] = 1
+    seconds = time.perf_counter() - start
+    os.remove(download_path)
+    return {'seconds': seconds, 'checksum': result['checksum'], 'segments': result['segments']}
+
+
+def run(backend: MockBackend, url: str, size: int, segments: List[int], repeats: int,
+        min_segment_size: int) -> Dict[str, Any]:
+    """
+    Compares single-stream and segmented downloads of one file served by the mock backend.
+
+    :param backend: The running mock backend serving the file.
+    :param url: The URL of the file.
+    :param size: The size of the file in bytes.
+    :param segments: The connection counts to measure; 1 is always measured, as the baseline.
+    :param repeats: Number of downloads per connection count; the median is reported.
+    :param min_segment_size: The minimum number of bytes per segment.
+    :return: Per connection count, the median seconds, the throughput and the speedup over one connection.
+    """
+    driver = Driver(backend.url, ship_logs=False, pool_size=max(segments))
+    download_path = os.path.join(tempfile.mkdtemp(prefix='fmap-download-'), 'file.bin')
+    report = {}
+    checksums = set()
+    for count in sorted(set([1] + segments)):
+        runs = [time_download(driver, url, download_path, count, min_segment_size) for _ in range(repeats)]
+        checksums.update(attempt['checksum'] for attempt in runs)
+        seconds = statistics.median(attempt['seconds'] for attempt in runs)
+        report[count] = {
+            'segments_used': runs[0]['segments'],
+            'seconds': round(seconds, 3),
+            'megabytes_per_second': round(size / seconds / 1e6, 2),
+            'speedup': round(report[1]['seconds'] / seconds, 2) if count > 1 else 1.0,
+        }
+    shutil.rmtree(os.path.dirname(download_path), ignore_errors=True)
+    if len(checksums) != 1:
+        raise RuntimeError(f"Downloads of {url} returned different checksums: {sorted(checksums)}")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare single-stream and segmented downloads on a throttled local server.")
+    parser.add_argument('--size', type=float, default=16.0, help="Size of the served file in megabytes.")
+    parser.add_argument('--rate', type=float, default=4.0, help="Bandwidth of each server connection in megabytes per second.")
+    parser.add_argument('--segments', nargs='+', type=int, default=[2, 4, 8], help="Connection counts to compare with 1.")
+    parser.add_argument('--min-segment-size', type=float, default=1.0, help="Minimum segment size in megabytes.")
+    parser.add_argument('--repeats', type=int, default=3, help="Downloads per connection count.")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    size = int(args.size * 1e6)
+    files_dir = tempfile.mkdtemp(prefix='fmap-files-')
+    try:
+        with open(os.path.join(files_dir, 'file.bin'), 'wb') as file:
+            file.write(os.urandom(size))
+        with MockBackend(files_dir=files_dir, file_rate=args.rate * 1e6) as backend:
+            report = run(backend, backend.file_url('file.bin'), size, args.segments, args.repeats,
+                         int(args.min_segment_size * 1e6))
+    finally:
+        shutil.rmtree(files_dir, ignore_errors=True)
+
+    output = json.dumps({'size': size, 'rate': int(args.rate * 1e6), 'results': report}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import os
+import re
+import json
+import hashlib
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+
+class DownloadError(Exception):
+    """Raised when a download is refused, truncated or fails its integrity check."""
+
+
+class StreamDownloader:
+    def __init__(self, driver, chunk_size: int = 1024 * 1024, max_size: Optional[int] = None,
+                 checksum_algorithm: str = 'sha256', session: Optional[requests.Session] = None) -> None:
+        """
+        Initialize the StreamDownloader.
+
+        :param driver: An instance of the Driver class, used for logging.
+        :param chunk_size: Number of bytes read from the socket and written to disk at a time.
+        :param max_size: Optional maximum size in bytes; larger downloads are aborted.
+        :param checksum_algorithm: Name of the hashlib algorithm used to checksum the downloaded bytes.
+        :param session: Optional requests session to reuse connections.
+        """
+        self.driver = driver
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.checksum_algorithm = checksum_algorithm
+        self.session = session or requests.Session()
+
+    def _hash_existing(self, part_path: str):
+        """
+        Feeds the bytes already present in a partial file into a new hasher.
+
+        :param part_path: The path to the partial file.
+        :return: The hasher and the number of bytes already on disk.
+        """
+        hasher = hashlib.new(self.checksum_algorithm)
+        size = 0
+        if os.path.exists(part_path):
+            with open(part_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(self.chunk_size), b''):
+                    hasher.update(chunk)
+                    size += len(chunk)
+        return hasher, size
+
+    def _check_size(self, size: int, url: str) -> None:
+        """
+        Aborts the download when the configured size cap is exceeded.
+
+        :param size: The number of bytes received or announced so far.
+        :param url: The URL being downloaded.
+        :raises DownloadError: If the size is larger than max_size.
+        """
+        if self.max_size is not None and size > self.max_size:
+            raise DownloadError(f"Download from {url} exceeds the size limit of {self.max_size} bytes")
+
+    def _read_validator(self, part_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Reads the validator recorded when a partial file was started.
+
+        :param part_path: The path to the partial file.
+        :return: The URL, ETag, Last-Modified and total size of the resource, or None if none was recorded.
+        """
+        try:
+            with open(f"{part_path}.json") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_validator(self, part_path: str, url: str, response: requests.Response, size: Optional[int]) -> None:
+        """
+        Records what a partial file is a copy of, so a later resume can check the resource didn't change.
+
+        :param part_path: The path to the partial file.
+        :param url: The URL being downloaded.
+        :param response: The response whose body is written to the partial file.
+        :param size: The total size of the resource, if known.
+        """
+        validator = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'size': size,
+        }
+        with open(f"{part_path}.json", 'w') as file:
+            json.dump(validator, file)
+
+    def _discard(self, part_path: str) -> None:
+        """
+        Removes a partial file and its validator.
+
+        :param part_path: The path to the partial file.
+        """
+        for path in (part_path, f"{part_path}.json"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _if_range(self, url: str, part_path: str) -> Optional[str]:
+        """
+        Returns the If-Range value that lets a partial file be resumed only if the resource is unchanged.
+
+        :param url: The URL being downloaded.
+        :param part_path: The path to the partial file.
+        :return: The strong ETag or, failing that, the Last-Modified date recorded with the partial file; None if
+            it can't be validated.
+        """
+        validator = self._read_validator(part_path)
+        if not validator or validator.get('url') != url:
+            return None
+        etag = validator.get('etag')
+        if etag and not etag.startswith('W/'):
+            # Weak ETags aren't allowed in If-Range
+            return etag
+        return validator.get('last_modified')
+
+    def download(self, url: str, download_path: str, expected_checksum: Optional[str] = None,
+                 on_chunk: Optional[Callable[[bytes], None]] = None, part_path: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Streams a URL to disk in fixed-size chunks.
+
+        The bytes are written to `<download_path>.part` and the file is renamed once complete. The ETag,
+        Last-Modified date and size of the resource are recorded next to it, in `<part_path>.json`. If a partial
+        file is left over from an interrupted run, the download resumes from its end with an HTTP Range request
+        whose If-Range header carries that validator, so the server sends the whole file again if it changed. The
+        download also restarts if the total size in Content-Range differs from the recorded one, and a partial
+        file without a validator is discarded. The checksum is computed while the bytes arrive.
+
+        :param url: The URL to download.
+        :param download_path: The local path where the file should be saved.
+        :param expected_checksum: Optional hex digest the downloaded file must match.
+        :param on_chunk: Optional callback receiving every byte of the file in order, including the bytes of a
+            resumed partial file, as they are written.
+        :param part_path: Optional path of the partial file, when it is shared by several destinations of the
+            same URL; defaults to `<download_path>.part`.
+        :param headers: Optional extra request headers, such as If-None-Match to download only a changed resource.
+        :return: A dictionary with the path, size, checksum, whether the download was resumed, the response
+            headers and whether the server answered 304 Not Modified, in which case nothing was written and the
+            path is None.
+        :raises DownloadError: If the size limit is exceeded or the checksum does not match.
+        :raises: requests.exceptions.RequestException if the download fails.
+        """
+        part_path = part_path or f"{download_path}.part"
+        hasher, offset = self._hash_existing(part_path)
+        request_headers = dict(headers or {})
+        if offset:
+            if_range = self._if_range(url, part_path)
+            if if_range:
+                request_headers.update({'Range': f'bytes={offset}-', 'If-Range': if_range})
+            else:
+                self.driver.record_log('info', f"Partial download of {url} can't be validated, restarting it")
+                self._discard(part_path)
+                hasher, offset = hashlib.new(self.checksum_algorithm), 0
+
+        with self.session.get(url, headers=request_headers, stream=True) as response:
+            if response.status_code == 304 and headers:
+                return {
+                    'path': None,
+                    'size': 0,
+                    'checksum': None,
+                    'resumed': False,
+                    'headers': response.headers,
+                    'not_modified': True,
+                }
+            if response.status_code == 416 and offset:
+                # The partial file is already complete (or invalid); start over
+                self._discard(part_path)
+                return self.download(url, download_path, expected_checksum, on_chunk, part_path, headers)
+            response.raise_for_status()
+
+            resumed = offset > 0 and response.status_code == 206
+            if resumed:
+                match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('Content-Range', ''))
+                recorded_size = self._read_validator(part_path).get('size')
+                if (not match or int(match.group(1)) != offset
+                        or (recorded_size is not None and match.group(2) not in ('*', str(recorded_size)))):
+                    self.driver.record_log('info', f"Resource at {url} changed size, restarting its download")
+                    self._discard(part_path)
+                    return self.download(url, download_path, expected_checksum, on_chunk, part_path, headers)
+            elif offset:
+                self.driver.record_log('info', f"Resource at {url} changed or the range was ignored, restarting download")
+                hasher, offset = hashlib.new(self.checksum_algorithm), 0
+
+            content_length = response.headers.get('Content-Length')
+            if response.headers.get('Content-Encoding'):
+                # iter_content decodes compressed bodies, so the header doesn't count the bytes we write
+                content_length = None
+            if content_length is not None:
+                try:
+                    self._check_size(offset + int(content_length), url)
+                except DownloadError:
+                    self._discard(part_path)
+                    raise
+            if not resumed:
+                self._write_validator(part_path, url, response,
+                                      int(content_length) if content_length is not None else None)
+
+            if resumed and on_chunk is not None:
+                with open(part_path, 'rb') as file:
+                    for chunk in iter(lambda: file.read(self.chunk_size), b''):
+                        on_chunk(chunk)
+
+            size = offset
+            try:
+                with open(part_path, 'ab' if resumed else 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if not chunk:
+                            continue
+                        size += len(chunk)
+                        self._check_size(size, url)
+                        hasher.update(chunk)
+                        file.write(chunk)
+                        if on_chunk is not None:
+                            on_chunk(chunk)
+            except DownloadError:
+                # Never resume a download that was refused for its size
+                self._discard(part_path)
+                raise
+
+        if content_length is not None and size != offset + int(content_length):
+            raise DownloadError(f"Download from {url} is truncated: got {size} bytes")
+
+        checksum = hasher.hexdigest()
+        if expected_checksum is not None and checksum.lower() != expected_checksum.lower():
+            self._discard(part_path)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {expected_checksum}, got {checksum}")
+
+        os.replace(part_path, download_path)
+        self._discard(part_path)
+        if resumed:
+            self.driver.record_log('info', f"Resumed download of {url} from byte {offset}")
+        return {
+            'path': download_path,
+            'size': size,
+            'checksum': checksum,
+            'resumed': resumed,
+            'headers': response.headers,
+            'not_modified': False,
+        }
+
+    def fetch_head(self, url: str, size: int = 64 * 1024) -> bytes:
+        """
+        Fetches the first bytes of a resource, with a Range request when the server supports it.
+
+        :param url: The URL to read.
+        :param size: The number of bytes to read.
+        :return: Up to `size` bytes from the start of the resource.
+        :raises: requests.exceptions.RequestException if the request fails.
+        """
+        head = b''
+        with self.session.get(url, headers={'Range': f'bytes=0-{size - 1}'}, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=min(size, self.chunk_size)):
+                head += chunk
+                if len(head) >= size:
+                    break
+        return head[:size]
+
+    def probe(self, url: str) -> Tuple[Optional[int], bool]:
+        """
+        Sends a HEAD request to learn the size of a resource and whether it can be fetched by byte range.
+
+        :param url: The URL to probe.
+        :return: The content length (None if unknown) and whether the server accepts Range requests.
+        """
+        try:
+            response = self.session.head(url, allow_redirects=True)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.driver.record_log('info', f"HEAD probe of {url} failed: {e}")
+            return None, False
+        content_length = response.headers.get('Content-Length')
+        size = int(content_length) if content_length is not None else None
+        accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+        return size, accepts_ranges and not response.headers.get('Content-Encoding')
+
+    def _split(self, size: int, segments: int, min_segment_size: int) -> List[Tuple[int, int]]:
+        """
+        Splits a file size into inclusive byte ranges.
+
+        :param size: The total size in bytes.
+        :param segments: The maximum number of ranges.
+        :param min_segment_size: The minimum size of a range in bytes.
+        :return: A list of (start, end) byte offsets, both inclusive.
+        """
+        count = max(1, min(segments, size // max(1, min_segment_size)))
+        step = -(-size // count)
+        return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+    def _fetch_segment(self, url: str, part_path: str, start: int, end: int) -> int:
+        """
+        Downloads one byte range into its place in a preallocated file.
+
+        :param url: The URL to download.
+        :param part_path: The preallocated partial file.
+        :param start: The first byte of the range.
+        :param end: The last byte of the range (inclusive).
+        :return: The number of bytes written.
+        :raises DownloadError: If the server does not honour the range.
+        """
+        headers = {'Range': f'bytes={start}-{end}'}
+        written = 0
+        with self.session.get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise DownloadError(f"Server ignored the range {start}-{end} for {url}")
+            with open(part_path, 'r+b') as file:
+                file.seek(start)
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    written += len(chunk)
+                    if written > end - start + 1:
+                        raise DownloadError(f"Segment {start}-{end} of {url} returned too many bytes")
+                    file.write(chunk)
+        if written != end - start + 1:
+            raise DownloadError(f"Segment {start}-{end} of {url} is truncated: got {written} bytes")
+        return written
+
+    def download_segmented(self, url: str, download_path: str, segments: int = 4,
+                           min_segment_size: int = 8 * 1024 * 1024,
+                           expected_checksum: Optional[str] = None, part_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Downloads a URL over several connections, one byte range each.
+
+        A resumable partial file left by a single stream is resumed with download. Otherwise the server is
+        probed with HEAD first. If it does not advertise byte ranges, does not announce a size, or the file is
+        too small to split into at least two segments, this falls back to a single stream. Otherwise the ranges
+        are fetched in parallel into a preallocated `<download_path>.part`, which is checksummed and renamed
+        once every segment has arrived. If a segment fails or the server ignores its range, the download is
+        restarted as a single stream.
+
+        :param url: The URL to download.
+        :param download_path: The local path where the file should be saved.
+        :param segments: The maximum number of parallel connections.
+        :param min_segment_size: The minimum number of bytes per segment.
+        :param expected_checksum: Optional hex digest the downloaded file must match.
+        :param part_path: Optional path of the partial file; defaults to `<download_path>.part`.
+        :return: A dictionary with the path, size, checksum, whether the download was resumed and the
+            number of segments used.
+        :raises DownloadError: If the size limit is exceeded or the checksum does not match.
+        :raises: requests.exceptions.RequestException if the single-stream download fails.
+        """
+        part_path = part_path or f"{download_path}.part"
+        if os.path.exists(part_path) and self._if_range(url, part_path):
+            # A single stream left a partial file behind; resuming it beats fetching every byte again
+            result = self.download(url, download_path, expected_checksum, part_path=part_path)
+            result['segments'] = 1
+            return result
+
+        size, accepts_ranges = self.probe(url)
+        ranges = self._split(size, segments, min_segment_size) if accepts_ranges and size else []
+        if len(ranges) < 2:
+            result = self.download(url, download_path, expected_checksum, part_path=part_path)
+            result['segments'] = 1
+            return result
+
+        self._check_size(size, url)
+        # Without a validator the preallocated file can't be mistaken for a resumable single-stream partial
+        self._discard(part_path)
+        with open(part_path, 'wb') as file:
+            file.truncate(size)
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                futures = [executor.submit(self._fetch_segment, url, part_path, start, end) for start, end in ranges]
+                for future in futures:
+                    future.result()
+        except (DownloadError, requests.exceptions.RequestException) as e:
+            # The ranges are written out of order, so the single stream starts from scratch
+            self._discard(part_path)
+            self.driver.record_log('info', f"Segmented download of {url} failed ({e}), falling back to a single stream")
+            result = self.download(url, download_path, expected_checksum, part_path=part_path)
+            result['segments'] = 1
+            return result
+        except BaseException:
+            self._discard(part_path)
+            raise
+
+        hasher, _ = self._hash_existing(part_path)
+        checksum = hasher.hexdigest()
+        if expected_checksum is not None and checksum.lower() != expected_checksum.lower():
+            self._discard(part_path)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {expected_checksum}, got {checksum}")
+
+        os.replace(part_path, download_path)
+        self.driver.record_log('info', f"Downloaded {url} over {len(ranges)} connections")
+        return {
+            'path': download_path,
+            'size': size,
+            'checksum': checksum,
+            'resumed': False,
+            'segments': len(ranges),
+        }
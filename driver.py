@@ -2,8 +2,10 @@ import logging
 import requests
 import time
 import os
+import threading
 from datetime import datetime
 import random
+from concurrent.futures import Future
 from typing import Optional, Dict, Any
 from fake_useragent import UserAgent
 from selenium.webdriver.common.keys import Keys
@@ -11,22 +13,75 @@ from selenium.webdriver.chrome.options import Options as ChromeOptions
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from video_frame_extractor import VideoFrameExtractor
+from downloader import StreamDownloader, DownloadError
+from http_session import DriverSession
+from result_writer import ResultWriter
+from log_shipper import LogShipper
+from photo_cache import PhotoCache
+from metrics import Metrics
+from profiler import IterationProfiler
+from webdriver_pool import WebDriverPool
 from facebook import Facebook
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Driver:
-    def __init__(self, base_url: str, sleep_time: int = 60) -> None:
+    def __init__(self, base_url: str, sleep_time: int = 60, video_options: Optional[Dict[str, Any]] = None,
+                 pool_size: int = 10, connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 retries: int = 3, ship_logs: bool = True, log_options: Optional[Dict[str, Any]] = None,
+                 photo_cache_options: Optional[Dict[str, Any]] = None, prefetch_listings: int = 2,
+                 metrics_port: Optional[int] = None, metrics_textfile: Optional[str] = None,
+                 webdriver_pool_size: int = 2) -> None:
         """
         Initialize the driver with given parameters.
 
         :param base_url: Base URL of the API.
         :param sleep_time: Time in seconds to wait between iterations (default: 60).
+        :param video_options: Optional keyword arguments for the VideoFrameExtractor (default: None).
+        :param pool_size: Maximum number of keep-alive connections per host of the HTTP session (default: 10).
+        :param connect_timeout: Seconds to wait for an HTTP connection (default: 5).
+        :param read_timeout: Seconds to wait for the server between two bytes of a response (default: 60).
+        :param retries: Number of retries of failed idempotent HTTP requests (default: 3).
+        :param ship_logs: Whether to send the log entries to the backend in the background (default: True).
+        :param log_options: Optional keyword arguments for the LogShipper (default: None).
+        :param photo_cache_options: Optional keyword arguments for the PhotoCache (default: None).
+        :param prefetch_listings: Number of upcoming listings whose photos are downloaded ahead (default: 2).
+        :param metrics_port: Optional port serving step and request timings at /metrics (default: None).
+        :param metrics_textfile: Optional .prom file the timings are written to after each iteration (default: None).
+            Timings are only recorded when a port or a textfile is given.
+        :param webdriver_pool_size: Maximum number of warm Chrome sessions kept open, one per account (default: 2).
         """
+        # Keep the options so worker processes can build an identical driver
+        options = dict(locals())
+        self.options = {name: value for name, value in options.items() if name not in ('self', 'base_url')}
         self.url = base_url
         self.currentAccount: Optional[Any] = None
         self.webDriver: Optional[Any] = None
         self.sleep_time = sleep_time
+        self.video_options = video_options or {}
+        # Every backend call and download shares this session and its connection pool
+        self.session = DriverSession(base_url, pool_size=pool_size, connect_timeout=connect_timeout,
+                                     read_timeout=read_timeout, retries=retries)
+        self.metrics = Metrics(enabled=bool(metrics_port or metrics_textfile))
+        self.metrics_textfile = metrics_textfile
+        if self.metrics.enabled:
+            self.session.observer = self.metrics
+        if metrics_port:
+            self.metrics.serve(metrics_port)
+        # Profiles iterations on demand, see IterationProfiler
+        self.profiler = IterationProfiler(self)
+        self.log_shipper = LogShipper(self, **(log_options or {})) if ship_logs else None
+        self.downloader = StreamDownloader(self, session=self.session)
+        self.http_options = {'pool_size': pool_size, 'connect_timeout': connect_timeout,
+                             'read_timeout': read_timeout, 'retries': retries}
+        # Kept across iterations so unchanged listing statistics aren't sent again
+        self.result_writer = ResultWriter(self)
+        self.photo_cache = PhotoCache(self, **(photo_cache_options or {}))
+        self.prefetch_listings = prefetch_listings
+        self.webdriver_pool = WebDriverPool(self, max_size=webdriver_pool_size)
+        # Created on first use, so aiohttp is only needed when something runs requests in the background
+        self.backend_client: Optional[Any] = None
+        self._backend_client_lock = threading.Lock()
     
     def start_driver(self):
         """
@@ -82,15 +137,12 @@ class Driver:
         self.webDriver = webdriver.Chrome(options=chromeOptions)
         self.record_log('info', "WebDriver started successfully.")
 
-    def download_file(self, url, download_path):
-        """Download an file from a URL."""
+    def download_file(self, url, download_path, expected_checksum: Optional[str] = None):
+        """Download an file from a URL, streaming it to disk in chunks."""
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            with open(download_path, 'wb') as file:
-                file.write(response.content)
+            self.downloader.download(url, download_path, expected_checksum)
             self.record_log('info', f"File downloaded successfully from {url}")
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, DownloadError) as e:
             self.record_log('error', f"Failed to download file: {e}")
             raise
 
@@ -193,15 +245,14 @@ class Driver:
             # Raise an exception for unsupported log types
             raise ValueError(f"Unsupported log type: {log_type}")
 
-        # Record the log message to a remote logging service
+        # Record the log message to a remote logging service, batched in the background
         log_entry = {
             'type': log_type,
             'content': content,
             'logged_at': datetime.now().isoformat()
         }
-
-        # Example usage in a logging function
-        #self.send_http_request('POST', 'logs/add', log_entry)
+        if self.log_shipper:
+            self.log_shipper.push(log_entry)
 
     def send_http_request(self, request_type: str, path: str, data: Optional[Dict[str, Any]] = None, files:bool=False) -> Dict[str, Any]:
         """
@@ -211,6 +262,7 @@ class Driver:
             request_type (str): The type of HTTP request ('get' or 'post').
             path (str): The path to append to the base URL.
             data (dict, optional): The data to send with a POST request.
+            files (bool, optional): Whether the data is a dictionary of files to send as multipart form data.
 
         Returns:
             dict: The JSON response from the server if successful.
@@ -220,17 +272,18 @@ class Driver:
             requests.RequestException: For errors in the HTTP request.
         """
         url = f'{self.url}/{path}'
+        http = self.session
         try:
             request_type_lower = request_type.lower()
 
             # Determine request type and send appropriate request
             if request_type_lower == 'post':
                 if files:
-                    response = requests.post(url, files=data)
+                    response = http.post(url, files=data)
                 else:
-                    response = requests.post(url, json=data)
+                    response = http.post(url, json=data)
             elif request_type_lower == 'get':
-                response = requests.get(url)
+                response = http.get(url)
             else:
                 raise ValueError(f"Unsupported request type: {request_type}")
 
@@ -254,6 +307,51 @@ class Driver:
             raise
         
 
+    def send_http_request_async(self, request_type: str, path: str, data: Optional[Dict[str, Any]] = None, files: bool = False,
+                                success_log: Optional[str] = None, error_log: Optional[str] = None) -> Future:
+        """
+        Sends an HTTP request on the background asyncio client without waiting for the response.
+
+        Use it for calls whose result the caller doesn't need right away, such as status updates, so they
+        run concurrently with the browser work instead of blocking it. The requests are counted in the
+        session's per-endpoint statistics and metrics, and are waited for at the end of the iteration.
+
+        Args:
+            request_type (str): The type of HTTP request ('get' or 'post').
+            path (str): The path to append to the base URL.
+            data (dict, optional): The data to send with a POST request.
+            files (bool, optional): Whether the data is a dictionary of files to send as multipart form data.
+            success_log (str, optional): Logged once the request succeeds.
+            error_log (str, optional): Logged with the error if the request fails.
+
+        Returns:
+            Future: Resolves to the JSON response, or raises the request's error.
+        """
+        with self._backend_client_lock:
+            if self.backend_client is None:
+                from async_client import BackendClient
+                self.backend_client = BackendClient(self.url, recorder=self.session.record, **self.http_options)
+            future = self.backend_client.submit(request_type, path, data, files)
+
+        def log_result(done: Future) -> None:
+            error = done.exception()
+            if error is not None and error_log:
+                self.record_log('error', f"{error_log}: {error}")
+            elif error is None and success_log:
+                self.record_log('info', success_log)
+
+        future.add_done_callback(log_result)
+        return future
+
+    def close_backend_client(self) -> None:
+        """
+        Waits for the background requests, then stops the asyncio client; the next request starts a new one.
+        """
+        with self._backend_client_lock:
+            backend_client, self.backend_client = self.backend_client, None
+        if backend_client is not None:
+            backend_client.close()
+
     def start(self) -> None:
         """
         Starts the driver and enters the main loop, handling iterations and logging.
@@ -265,8 +363,8 @@ class Driver:
         
         while True:
             try:
-                # Execute a single iteration of drivers's main function
-                self.run_iter()
+                # Execute a single iteration of drivers's main function, profiled when requested
+                self.profiler.run(self.run_iter)
                 # Sleep for the specified amount of time between iterations
                 time.sleep(self.sleep_time)
 
@@ -278,5 +376,19 @@ class Driver:
     
 
     def run_iter(self) -> None:
-        VideoFrameExtractor(self)
-        Facebook(self)
\ No newline at end of file
+        try:
+            with self.metrics.span('video_frames'):
+                VideoFrameExtractor(self, **self.video_options)
+            with self.metrics.span('facebook'):
+                Facebook(self)
+        finally:
+            # The iteration's status updates are sent before its statistics are reported
+            self.close_backend_client()
+            if self.metrics_textfile:
+                self.metrics.write_textfile(self.metrics_textfile)
+        pool = self.webdriver_pool.stats
+        self.record_log('info', f"WebDriver pool: {pool['hits']} hits, {pool['misses']} misses, "
+                                f"{pool['evictions']} evictions, {pool['unhealthy']} failed health checks.")
+        for endpoint, stats in sorted(self.session.stats().items()):
+            self.record_log('info', f"HTTP {endpoint}: {stats['requests']} requests, {stats['errors']} errors, "
+                                    f"avg {stats['avg_seconds']:.3f}s, max {stats['max_seconds']:.3f}s")
\ No newline at end of file
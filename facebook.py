@@ -1,13 +1,23 @@
-import os
 import time
-import uuid
 import random
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
+from photo_prefetcher import PhotoPrefetcher
 
 class Facebook:
+    # Wall-clock budget and attempt cap for selecting a listing's location
+    LOCATION_DEADLINE = 30.0
+    LOCATION_MAX_ATTEMPTS = 10
+
     def __init__(self, driver) -> None:
         self.driver = driver
+        # Locations fetched during this batch, by location ID, and the location ID of each posting
+        self.locations = {}
+        self.posting_locations = {}
+        self.location_metrics = {'resolutions': 0, 'attempts': 0, 'failures': 0, 'seconds': 0.0,
+                                 'backend_calls': 0, 'cache_hits': 0}
+        # Set while a batch of listings is being created, so add_pictures can use the prefetched photos
+        self.prefetcher = None
         self.handle_listings_to_remove()
         self.handle_listings_to_create()
         self.update_results()
@@ -17,21 +27,52 @@ class Facebook:
         if accounts:
             for account in accounts:
                 try:
-                    if self.driver.currentAccount != account:
-                        if self.driver:
-                            self.driver.stop_driver()
-                        
-                        # Initialize a new driver instance for the current account
-                        self.driver.currentAccount = account
-                        self.driver.start_driver()
-                        self.login()
-
-                    self.update_account_results()
+                    self.use_account(account)
+
+                    with self.driver.metrics.span('update_account_results'):
+                        self.update_account_results()
                     time.sleep(random.uniform(3.0, 5.0))
                 except Exception as e:
                     # Log errors related to account processing
                     self.driver.record_log('error', f"Failed to process account {account.get('id', 'unknown')}: {e}")
     
+    def use_account(self, account):
+        """
+        Makes account the current one, with a responsive WebDriver logged into it.
+
+        Switching reuses the account's warm WebDriver from the pool or starts a new one. Staying on the same
+        account still goes through the pool, so a WebDriver that crashed since the last step is replaced.
+
+        Args:
+            account (dict): The account, as returned by the backend.
+
+        Raises:
+            Exception: If a new WebDriver can't be started or logged in.
+        """
+        if self.driver.currentAccount != account:
+            with self.driver.metrics.span('switch_account'):
+                started = self.driver.webdriver_pool.acquire(account)
+        else:
+            started = self.driver.webdriver_pool.acquire(account)
+        if started:
+            self.pooled_login()
+
+    def pooled_login(self):
+        """
+        Logs into the current account, dropping its pooled WebDriver if the login fails.
+
+        A WebDriver that never logged in must not be handed out again as a warm session.
+
+        Raises:
+            Exception: If the login fails.
+        """
+        try:
+            with self.driver.metrics.span('login'):
+                self.login()
+        except Exception:
+            self.driver.webdriver_pool.discard(self.driver.currentAccount['id'])
+            raise
+
     def update_account_results(self):
         self.driver.webDriver.get("https://www.facebook.com/marketplace/you/selling")
         
@@ -59,7 +100,21 @@ class Facebook:
             if len(elements) >= self.driver.currentAccount['total_listings']:
                 break
         
-        for element in elements:
+        account_id = self.driver.currentAccount['id']
+        try:
+            self.collect_account_results(elements)
+        finally:
+            # Send whatever is still buffered once the account is done, even if scraping stopped early
+            self.driver.result_writer.flush(account_id)
+
+    def collect_account_results(self, elements):
+        """
+        Reads the title, clicks and location of every listing card and queues them on the driver's result writer.
+
+        Args:
+            elements (list): The listing card elements of the selling page.
+        """
+        for index, element in enumerate(elements):
             title_xpath = "(((//div[@aria-label='Your Listing']//a/div)[1]/div)[2]/div/div/span)[1]"
             clicks_xpath = '//div[@aria-label="The number of times people viewed the details page of your Marketplace listing in the last 14 days."]/..'
             location_xpath = "//div[@aria-label='Your Listing']//a//span/span/span/span[@aria-hidden='true']/../.."
@@ -78,11 +133,8 @@ class Facebook:
                 "location": location,
             }
         
-            try:
-                self.driver.send_http_request('POST', f"accounts/{self.driver.currentAccount['id']}/update", data)
-                self.driver.record_log('info', f"Data updated")
-            except Exception as e:
-                self.driver.record_log('error', f"Error updating the data: {e}")
+            # Several listings can share a title, so the card's position tells them apart
+            self.driver.result_writer.add(self.driver.currentAccount['id'], data, key=(index, title))
 
             self.driver.click("//div[@aria-label='Close']")
 
@@ -97,38 +149,48 @@ class Facebook:
         listings = self.driver.send_http_request('GET', 'listings/get')
         
         if listings:
-            for listing in listings['listings']:
-                try:
-                    self.currentPostingId = listing['posting_id']
-                    # Check if the current account needs to be updated
-                    if self.driver.currentAccount != listing['account']:
-                        if self.driver:
-                            self.driver.stop_driver()
-                        
-                        # Initialize a new driver instance for the current account
-                        self.driver.currentAccount = listing['account']
-                        self.driver.start_driver()
-                        self.login()
-                    
-                    # Check if the driver is blocked and perform necessary actions
-                    if self.driver.currentAccount is not None and self.is_blocked():
-                        self.driver.webDriver.delete_all_cookies()
-                        self.login()
-                    
-                    # Create the listing
-                    self.create_listing(listing)
-                    time.sleep(random.uniform(3.0, 5.0))
-                except Exception as e:
-                    # Log errors related to listing processing
-                    self.driver.record_log('error', f"Failed to process listing {listing.get('id', 'unknown')}: {e}")
-            
-            # Stop the driver after processing all listings
-            if self.driver:
-                self.driver.stop_driver()
+            with PhotoPrefetcher(self.driver, lookahead=self.driver.prefetch_listings) as self.prefetcher:
+                self.create_listings(listings['listings'])
+            self.prefetcher = None
+
+            metrics = self.location_metrics
+            if metrics['resolutions']:
+                self.driver.record_log('info', f"Locations: {metrics['resolutions']} resolved, {metrics['failures']} failed, "
+                                               f"{metrics['attempts'] / metrics['resolutions']:.1f} attempts and "
+                                               f"{metrics['seconds'] / metrics['resolutions']:.1f}s on average, "
+                                               f"{metrics['backend_calls']} backend calls, {metrics['cache_hits']} cache hits.")
+            # The WebDriver stays open in the pool for the next phase
         else:
             # Log info if no new listings are found
             self.driver.record_log('info', "No new listings to add.")
 
+    def create_listings(self, listings):
+        """
+        Creates each listing of a batch, downloading the photos of the next ones in the background.
+
+        Args:
+            listings (list): The listings to create.
+        """
+        for index, listing in enumerate(listings):
+            try:
+                self.prefetcher.schedule(listings, index)
+                self.currentPostingId = listing['posting_id']
+                # Switch to the listing's account, or check that its WebDriver still answers
+                self.use_account(listing['account'])
+                
+                # Check if the driver is blocked and perform necessary actions
+                if self.driver.currentAccount is not None and self.is_blocked():
+                    self.driver.webDriver.delete_all_cookies()
+                    self.pooled_login()
+                
+                # Create the listing
+                with self.driver.metrics.span('create_listing'):
+                    self.create_listing(listing)
+                time.sleep(random.uniform(3.0, 5.0))
+            except Exception as e:
+                # Log errors related to listing processing
+                self.driver.record_log('error', f"Failed to process listing {listing.get('id', 'unknown')}: {e}")
+
     def handle_listings_to_remove(self):
         """
         Handles the removal of listings by processing each listing and performing necessary actions.
@@ -143,26 +205,17 @@ class Facebook:
         if accounts:
             for account in accounts:
                 try:
-                    # Check if the current account needs to be updated
-                    if self.driver.currentAccount != account:
-                        if self.driver:
-                            self.driver.stop_driver()
-                        
-                        # Initialize a new driver instance for the current account
-                        self.driver.currentAccount = account
-                        self.driver.start_driver()
-                        self.login()
+                    # Switch to the account, or check that its WebDriver still answers
+                    self.use_account(account)
                     
                     # drop the listings
-                    self.drop_listings()
+                    with self.driver.metrics.span('drop_listings'):
+                        self.drop_listings()
                     time.sleep(random.uniform(3.0, 5.0))
                 except Exception as e:
                     # Log errors related to listing processing
                     self.driver.record_log('error', f"Failed to drop listings from {account.get('id', 'unknown')}: {e}")
-            
-            # Stop the driver after processing all listings
-            if self.driver:
-                self.driver.stop_driver()
+            # The WebDriver stays open in the pool for the next phase
         else:
             # Log info if no new listings are found
             self.driver.record_log('info', "No new listings to remove.")
@@ -323,6 +376,26 @@ class Facebook:
             self.driver.record_log('error', f"Error checking limit status: {e}")
             raise
 
+    def step(self, name, function, *args):
+        """
+        Runs one step of the listing creation under a timing span.
+
+        A falsy result counts as a failed step, as it does for create_listing.
+
+        Args:
+            name (str): The name of the step in the metrics.
+            function (callable): The step.
+            *args: The arguments of the step.
+
+        Returns:
+            The result of the step.
+        """
+        with self.driver.metrics.span(name) as span:
+            result = function(*args)
+            if not result:
+                span.failed = True
+            return result
+
     def create_listing(self, listing: dict) -> None:
         """
         Creates a marketplace listing on Facebook with the provided details.
@@ -346,56 +419,56 @@ class Facebook:
 
         try:
             # Add pictures to the listing
-            if not self.add_pictures(listing.get("photos", [])):
+            if not self.step('add_pictures', self.add_pictures, listing.get("photos", [])):
                 raise Exception("Failed to add pictures")
             
             # Add title to the listing
-            if not self.add_title(listing.get("title", "")):
+            if not self.step('add_title', self.add_title, listing.get("title", "")):
                 raise Exception("Failed to add title")
             
             # Add price to the listing
-            if not self.add_price(listing.get("postings_price", "")):
+            if not self.step('add_price', self.add_price, listing.get("postings_price", "")):
                 raise Exception("Failed to add price")
             
             # Add category to the listing
-            if not self.add_category(listing.get("category", "")):
+            if not self.step('add_category', self.add_category, listing.get("category", "")):
                 raise Exception("Failed to add category")
             
             # Add condition to the listing
-            if not self.add_condition(listing.get("condition", "")):
+            if not self.step('add_condition', self.add_condition, listing.get("condition", "")):
                 raise Exception("Failed to add condition")
             
             # Add description to the listing
-            if not self.add_description(listing.get("description", "")):
+            if not self.step('add_description', self.add_description, listing.get("description", "")):
                 raise Exception("Failed to add description")
             
             # Add availability to the listing
-            if not self.add_availability(listing.get("availability", "")):
+            if not self.step('add_availability', self.add_availability, listing.get("availability", "")):
                 raise Exception("Failed to add availability")
             
             # Add tags to the listing
-            if not self.add_tags(listing.get("tags", [])):
+            if not self.step('add_tags', self.add_tags, listing.get("tags", [])):
                 raise Exception("Failed to add tags")
             
             # Add location to the listing
-            location = self.add_location()
+            location = self.step('add_location', self.add_location)
             if not location:
                 raise Exception("Failed to add location")
             
             # Hide listing from friends if required
-            if not self.hide_from_friends():
+            if not self.step('hide_from_friends', self.hide_from_friends):
                 raise Exception("Failed to hide from friends")
             
             # Proceed to the next step
-            if not self.next():
+            if not self.step('next', self.next):
                 raise Exception("Failed to proceed to the next step")
             
             # Publish the listing
-            if not self.publish():
+            if not self.step('publish', self.publish):
                 raise Exception("Failed to publish listing")
             
             # Confirm listing publication
-            if not self.listing_published(listing, location):
+            if not self.step('listing_published', self.listing_published, listing, location):
                 raise Exception("Failed to confirm listing publication")
 
             # Log success
@@ -410,7 +483,7 @@ class Facebook:
         """
         Adds pictures to the listing.
 
-        This method downloads pictures from given URLs and uploads them to the listing. It handles the downloading
+        This method fetches pictures from given URLs through the driver's photo cache and uploads them to the listing. It handles the downloading
         and uploading processes and logs any errors encountered.
 
         Args:
@@ -425,23 +498,26 @@ class Facebook:
         try:
             self.driver.record_log('info', "Adding pictures.")
             
-            download_folder = "download/photos"
-            os.makedirs(download_folder, exist_ok=True)
-            
-            photos_paths = []
-            for picture in pictures:
-                photo_url = picture["photo"]["photo"]
-                unique_filename = f"{uuid.uuid4()}.jpg" 
-                download_path = os.path.join(download_folder, unique_filename)
-                self.driver.download_file(photo_url, download_path)
-                photos_paths.append(os.path.abspath(download_path))
-            
-            pictures_paths_str = "\n".join(photos_paths)
-            xpath = "//input[@type='file'][@multiple]"
-            
-            if not self.driver.type(xpath, pictures_paths_str):
-                self.driver.record_log('error', "Failed to upload pictures.")
-                return False
+            # Cached photos are handed to the file input as they are, so a repost downloads nothing
+            photo_urls = [picture["photo"]["photo"] for picture in pictures]
+            # Keep the photos on disk until Chrome has read them, whatever the cache evicts meanwhile
+            self.driver.photo_cache.pin(photo_urls)
+            try:
+                photos_paths = []
+                for photo_url in photo_urls:
+                    if self.prefetcher:
+                        photos_paths.append(self.prefetcher.get(photo_url))
+                    else:
+                        photos_paths.append(self.driver.photo_cache.get(photo_url))
+                
+                pictures_paths_str = "\n".join(photos_paths)
+                xpath = "//input[@type='file'][@multiple]"
+                
+                if not self.driver.type(xpath, pictures_paths_str):
+                    self.driver.record_log('error', "Failed to upload pictures.")
+                    return False
+            finally:
+                self.driver.photo_cache.unpin(photo_urls)
             
             self.driver.record_log('info', "Pictures added successfully.")
             return True
@@ -670,46 +746,74 @@ class Facebook:
             self.driver.record_log('error', f"Error adding tags: {e}")
             raise
 
-    def add_location(self, iter=0):
+    def get_location(self, posting_id):
         """
-        Adds a location to the listing.
-
-        This method types the location into the location field and selects it from the suggestions. It handles
-        the process of typing and selecting the location, and retries if necessary. It logs any errors encountered
-        during the operation.
+        Returns the location of a posting, asking the backend only once per posting for the whole batch.
 
         Args:
-            iter (int, optional): The current iteration count for retries. Defaults to 0.
+            posting_id (str): The ID of the posting.
 
         Returns:
-            str: The ID of the selected location if successful, None otherwise.
+            dict: The location, with its ID, name and wilaya.
+        """
+        location_id = self.posting_locations.get(posting_id)
+        if location_id is not None:
+            self.location_metrics['cache_hits'] += 1
+            return self.locations[location_id]
 
-        Raises:
-            Exception: If an error occurs while adding the location.
+        self.location_metrics['backend_calls'] += 1
+        location = self.driver.send_http_request('GET', f"locations/{posting_id}/get")
+        # Postings sharing a location share one entry
+        location = self.locations.setdefault(location['id'], location)
+        self.posting_locations[posting_id] = location['id']
+        return location
+
+    def add_location(self):
         """
-        try:
-            self.driver.record_log('info', "Adding location.")
-            
-            location = self.driver.send_http_request('GET', 'locations/'+self.driver.currentPostingId+'/get')
-            location_str = f"{location['name']}, {location['wilaya']['name']}, Algeria"
+        Adds a location to the listing.
 
-            xpath = "//label[contains(., 'Location')]//input"
-            if not self.driver.type(xpath, location_str, deleteBefore=True):
-                self.driver.record_log('error', "Failed to type location.")
-                return None
-            
-            xpath = "//ul[@role='listbox']/li[@role='option'][1]"
-            time.sleep(random.uniform(1.5, 2))
-            if not self.driver.click(xpath) and iter < 100:
-                return self.add_location(iter=iter + 1)
-            
-            self.driver.record_log('info', "Location added successfully.")
-            return location['id']
-        except Exception as e:
-            self.driver.record_log('error', f"Error adding location: {e}")
-            if iter < 100:
-                return self.add_location(iter=iter + 1)
-            raise
+        This method types the location into the location field and selects it from the suggestions. It retries
+        in a loop until the suggestion is selected or LOCATION_DEADLINE seconds have passed, whichever comes
+        first, and records the attempts and time spent in `location_metrics`.
+
+        Returns:
+            str: The ID of the selected location if successful, None otherwise.
+        """
+        self.driver.record_log('info', "Adding location.")
+        start = time.monotonic()
+        deadline = start + self.LOCATION_DEADLINE
+        attempts = 0
+        location_id = None
+
+        while attempts < self.LOCATION_MAX_ATTEMPTS and (attempts == 0 or time.monotonic() < deadline):
+            attempts += 1
+            try:
+                location = self.get_location(self.currentPostingId)
+                location_str = f"{location['name']}, {location['wilaya']['name']}, Algeria"
+
+                xpath = "//label[contains(., 'Location')]//input"
+                if not self.driver.type(xpath, location_str, deleteBefore=True):
+                    self.driver.record_log('error', "Failed to type location.")
+                    break
+
+                xpath = "//ul[@role='listbox']/li[@role='option'][1]"
+                time.sleep(random.uniform(1.5, 2))
+                if self.driver.click(xpath):
+                    location_id = location['id']
+                    break
+            except Exception as e:
+                self.driver.record_log('error', f"Error adding location (attempt {attempts}): {e}")
+
+        seconds = time.monotonic() - start
+        self.location_metrics['resolutions'] += 1
+        self.location_metrics['attempts'] += attempts
+        self.location_metrics['seconds'] += seconds
+        if location_id is None:
+            self.location_metrics['failures'] += 1
+            self.driver.record_log('error', f"Failed to add location after {attempts} attempts in {seconds:.1f}s.")
+            return None
+        self.driver.record_log('info', f"Location added successfully after {attempts} attempts in {seconds:.1f}s.")
+        return location_id
 
     def hide_from_friends(self):
         """
@@ -828,52 +932,41 @@ class Facebook:
         """
         Marks the listing as unpublished in the backend.
 
-        This method sends a POST request to the backend API to update the status of the listing to 'unpublished'.
-        It logs the success or failure of the request and returns a boolean indicating the result.
+        This method sends a POST request to the backend API in the background to update the status of the listing
+        to 'unpublished', so the next listing starts without waiting for it. The outcome is logged once known.
 
         Args:
             listing (dict): A dictionary containing the listing details, including the listing ID.
             exception (str): An explanation of why the listing could not be published.
 
         Returns:
-            bool: True if the request was successful and the listing was marked as unpublished, False otherwise.
+            Future: Resolves to the backend's response, or raises the request's error.
         """
         data = {
             "state": "unpublished",
             "exception": exception
         }
         
-        try:
-            self.driver.send_http_request('POST', f"listings/{listing['id']}/unpublished", data)
-            self.driver.record_log('info', f"Listing {listing['id']} marked as unpublished.")
-            return True
-        except Exception as e:
-            self.driver.record_log('error', f"Error marking listing {listing['id']} as unpublished: {e}")
-            return False
+        return self.driver.send_http_request_async('POST', f"listings/{listing['id']}/unpublished", data,
+                                                   success_log=f"Listing {listing['id']} marked as unpublished.",
+                                                   error_log=f"Error marking listing {listing['id']} as unpublished")
 
     def listings_droped(self):
         """
-        Marks the listing as unpublished in the backend.
+        Marks the listings of the current account as droped in the backend.
 
-        This method sends a POST request to the backend API to update the status of the listing to 'unpublished'.
-        It logs the success or failure of the request and returns a boolean indicating the result.
-
-        Args:
-            listing (dict): A dictionary containing the listing details, including the listing ID.
-            exception (str): An explanation of why the listing could not be published.
+        This method sends a POST request to the backend API in the background to update the status of the
+        account's listings to 'droped'. The outcome is logged once known.
 
         Returns:
-            bool: True if the request was successful and the listing was marked as unpublished, False otherwise.
+            Future: Resolves to the backend's response, or raises the request's error.
         """
         data = {
             "state": "droped",
         }
         
-        try:
-            self.driver.send_http_request('POST', f"listings/{self.driver.currentAccount['id']}/droped", data)
-            self.driver.record_log('info', f"Listings from {self.driver.currentAccount['id']} marked as droped.")
-            return True
-        except Exception as e:
-            self.driver.record_log('error', f"Error marking listings from {self.driver.currentAccount['id']} as droped: {e}")
-            return False
+        account_id = self.driver.currentAccount['id']
+        return self.driver.send_http_request_async('POST', f"listings/{account_id}/droped", data,
+                                                   success_log=f"Listings from {account_id} marked as droped.",
+                                                   error_log=f"Error marking listings from {account_id} as droped")
 
@@ -0,0 +1,119 @@
+import cv2
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+FORMATS = ('jpg', 'webp')
+
+
+class FrameEncoder:
+    def __init__(self, output_format: str = 'jpg', quality: int = 95, max_long_edge: Optional[int] = None,
+                 progressive: bool = False, optimize: bool = False, workers: int = 2,
+                 report_savings: bool = False) -> None:
+        """
+        Initialize a FrameEncoder, which resizes and encodes frames to disk in a thread pool.
+
+        Use it as a context manager; leaving the block waits for every pending frame to be written.
+
+        :param output_format: Output format, 'jpg' or 'webp'.
+        :param quality: JPEG or WebP quality, from 0 to 100.
+        :param max_long_edge: Optional maximum length in pixels of the longer side; larger frames are downscaled.
+        :param progressive: Whether to write progressive JPEGs.
+        :param optimize: Whether to optimize the JPEG Huffman tables.
+        :param workers: Number of threads encoding frames.
+        :param report_savings: Whether to also encode each frame with OpenCV's default JPEG settings in memory,
+            to report how many bytes the output settings saved.
+        :raises ValueError: If the output format is not supported.
+        """
+        if output_format not in FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.extension = f".{output_format}"
+        self.max_long_edge = max_long_edge
+        self.workers = max(1, workers)
+        self.report_savings = report_savings
+        if output_format == 'webp':
+            self.params = [cv2.IMWRITE_WEBP_QUALITY, quality]
+        else:
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, quality,
+                           cv2.IMWRITE_JPEG_PROGRESSIVE, int(progressive),
+                           cv2.IMWRITE_JPEG_OPTIMIZE, int(optimize)]
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending = deque()
+        self.report = {'frames': 0, 'bytes_written': 0, 'baseline_bytes': 0}
+
+    def __enter__(self) -> 'FrameEncoder':
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='encode')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            while self.pending:
+                self._collect(self.pending.popleft())
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def _collect(self, future) -> None:
+        written, baseline = future.result()
+        self.report['frames'] += 1
+        self.report['bytes_written'] += written
+        self.report['baseline_bytes'] += baseline
+
+    def resize(self, frame):
+        """
+        Downscales a frame so its longer side is at most max_long_edge.
+
+        :param frame: The BGR frame.
+        :return: The resized frame, or the frame itself if it is small enough.
+        """
+        if not self.max_long_edge:
+            return frame
+        height, width = frame.shape[:2]
+        long_edge = max(height, width)
+        if long_edge <= self.max_long_edge:
+            return frame
+        scale = self.max_long_edge / long_edge
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+    def encode(self, frame, frame_path: str) -> Tuple[int, int]:
+        """
+        Resizes, encodes and writes a single frame.
+
+        :param frame: The BGR frame.
+        :param frame_path: The path the encoded frame is written to.
+        :return: The number of bytes written and the size of the default encoding (0 unless report_savings).
+        :raises ValueError: If OpenCV fails to encode the frame.
+        """
+        baseline = cv2.imencode('.jpg', frame)[1].size if self.report_savings else 0
+        success, buffer = cv2.imencode(self.extension, self.resize(frame), self.params)
+        if not success:
+            raise ValueError(f"Failed to encode {frame_path}")
+        with open(frame_path, 'wb') as file:
+            file.write(buffer.tobytes())
+        return buffer.size, baseline
+
+    def submit(self, frame, frame_path: str) -> None:
+        """
+        Queues a frame for encoding, waiting for older frames first when too many are in flight.
+
+        :param frame: The BGR frame.
+        :param frame_path: The path the encoded frame is written to.
+        """
+        # Bound the number of decoded frames held in memory while the pool catches up
+        while len(self.pending) >= self.workers * 2:
+            self._collect(self.pending.popleft())
+        self.pending.append(self.executor.submit(self.encode, frame, frame_path))
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns the encoding report of the frames written so far.
+
+        :return: A dictionary with the frame count, bytes written and, when measured, the bytes saved.
+        """
+        report = dict(self.report)
+        if self.report_savings:
+            report['bytes_saved'] = report['baseline_bytes'] - report['bytes_written']
+        else:
+            del report['baseline_bytes']
+        return report
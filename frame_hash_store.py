@@ -0,0 +1,78 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Iterable, List
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit, so unsigned hashes are stored in two's complement."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class FrameHashStore:
+    def __init__(self, path: str = "data/frame_hashes.sqlite3") -> None:
+        """
+        Initialize the store of frame hashes already uploaded to each photo group.
+
+        Hashes are kept per algorithm, since hashes of different algorithms can't be compared. A connection is
+        opened per call, so the store can be shared between threads and processes.
+
+        :param path: The path of the SQLite database file.
+        """
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(frame_hashes)")]
+            if columns and 'algorithm' not in columns:
+                # Rows of the first schema don't say which algorithm made them, so they can't be trusted
+                connection.execute("DROP TABLE frame_hashes")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS frame_hashes ("
+                "photos_group_id TEXT NOT NULL, "
+                "algorithm TEXT NOT NULL, "
+                "hash INTEGER NOT NULL, "
+                "uploaded_at TEXT NOT NULL, "
+                "PRIMARY KEY (photos_group_id, algorithm, hash))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def hashes(self, photos_group_id: str, algorithm: str) -> List[int]:
+        """
+        Returns the hashes of the frames already uploaded to a photo group.
+
+        :param photos_group_id: The ID of the photo group.
+        :param algorithm: The perceptual hash algorithm the hashes were computed with.
+        :return: The hashes as unsigned 64-bit integers.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT hash FROM frame_hashes WHERE photos_group_id = ? AND algorithm = ?",
+                (str(photos_group_id), algorithm)
+            ).fetchall()
+        return [_to_unsigned(row[0]) for row in rows]
+
+    def add(self, photos_group_id: str, algorithm: str, hashes: Iterable[int]) -> None:
+        """
+        Records frame hashes as uploaded to a photo group.
+
+        :param photos_group_id: The ID of the photo group.
+        :param algorithm: The perceptual hash algorithm the hashes were computed with.
+        :param hashes: The hashes as unsigned 64-bit integers.
+        """
+        uploaded_at = datetime.now().isoformat()
+        rows = [(str(photos_group_id), algorithm, _to_signed(int(value)), uploaded_at) for value in hashes]
+        if not rows:
+            return
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO frame_hashes (photos_group_id, algorithm, hash, uploaded_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
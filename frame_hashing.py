@@ -0,0 +1,143 @@
+import numpy as np
+from typing import Sequence
+
+# ITU-R BT.601 luma weights in OpenCV's BGR channel order
+GRAY_WEIGHTS = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+
+ALGORITHMS = ('ahash', 'dhash', 'phash')
+
+# Number of pixels sampled along each side of an output pixel when downsampling
+SAMPLES_PER_BLOCK = 8
+
+
+def _stack(frames, height: int, width: int) -> np.ndarray:
+    """
+    Stacks decoded frames into a single (N, H, W, C) array, keeping only a strided grid of pixels.
+
+    Only SAMPLES_PER_BLOCK pixels per output pixel are kept along each axis, so a 1080p frame reduced
+    to an 8x8 hash is read through a strided view of ~1k pixels instead of copied in full.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames, or an array that is already stacked.
+    :param height: The height the frames will be reduced to.
+    :param width: The width the frames will be reduced to.
+    :return: The stacked, subsampled frames.
+    """
+    shape = frames[0].shape
+    row_step = max(1, shape[0] // (height * SAMPLES_PER_BLOCK))
+    col_step = max(1, shape[1] // (width * SAMPLES_PER_BLOCK))
+    if isinstance(frames, np.ndarray):
+        stack = frames[:, ::row_step, ::col_step]
+    else:
+        stack = np.stack([frame[::row_step, ::col_step] for frame in frames])
+    if stack.ndim == 3:
+        stack = stack[..., np.newaxis]
+    return stack
+
+
+def _block_means(frames, height: int, width: int) -> np.ndarray:
+    """
+    Downsamples a batch of frames to height x width grayscale images by averaging pixel blocks.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames.
+    :param height: The output height.
+    :param width: The output width.
+    :return: A float32 array of shape (N, height, width).
+    """
+    stack = _stack(frames, height, width)
+    rows = np.linspace(0, stack.shape[1], height + 1).astype(np.intp)
+    cols = np.linspace(0, stack.shape[2], width + 1).astype(np.intp)
+    sums = np.add.reduceat(stack, rows[:-1], axis=1, dtype=np.float32)
+    sums = np.add.reduceat(sums, cols[:-1], axis=2)
+    sums /= np.outer(np.maximum(np.diff(rows), 1), np.maximum(np.diff(cols), 1))[..., np.newaxis]
+    if sums.shape[3] == 1:
+        gray = sums[..., 0]
+    else:
+        # Block averaging and the luma conversion are both linear, so converting the small image is equivalent
+        gray = sums[..., :3] @ GRAY_WEIGHTS
+    # Round to 8-bit levels like a PIL "L" image, so sensor noise in flat areas doesn't flip dHash bits
+    return np.rint(gray)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    """
+    Returns the orthonormal DCT-II matrix of the given size.
+
+    :param size: The transform size.
+    :return: A (size, size) float32 matrix.
+    """
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[np.newaxis, :] + 1) * n[:, np.newaxis] / (2 * size))
+    matrix[0] *= np.sqrt(1 / size)
+    matrix[1:] *= np.sqrt(2 / size)
+    return matrix.astype(np.float32)
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """
+    Packs (N, 8, 8) boolean hash matrices into unsigned 64-bit integers, first bit most significant.
+
+    :param bits: The boolean hash bits.
+    :return: A uint64 array of shape (N,).
+    """
+    packed = np.packbits(bits.reshape(len(bits), -1), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+def average_hash(frames, hash_size: int = 8) -> np.ndarray:
+    """
+    Computes the average hash of a batch of frames.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames.
+    :param hash_size: The hash width and height; 8 yields 64-bit hashes.
+    :return: A uint64 array with one hash per frame.
+    """
+    pixels = _block_means(frames, hash_size, hash_size)
+    return pack_bits(pixels > pixels.mean(axis=(1, 2), keepdims=True))
+
+
+def difference_hash(frames, hash_size: int = 8) -> np.ndarray:
+    """
+    Computes the horizontal difference hash of a batch of frames.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames.
+    :param hash_size: The hash width and height; 8 yields 64-bit hashes.
+    :return: A uint64 array with one hash per frame.
+    """
+    pixels = _block_means(frames, hash_size, hash_size + 1)
+    return pack_bits(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+
+def perceptual_hash(frames, hash_size: int = 8, highfreq_factor: int = 4) -> np.ndarray:
+    """
+    Computes the DCT-based perceptual hash of a batch of frames.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames.
+    :param hash_size: The hash width and height; 8 yields 64-bit hashes.
+    :param highfreq_factor: How much larger than the hash the image transformed by the DCT is.
+    :return: A uint64 array with one hash per frame.
+    """
+    size = hash_size * highfreq_factor
+    pixels = _block_means(frames, size, size)
+    dct = _dct_matrix(size)
+    lowfreq = (dct @ pixels @ dct.T)[:, :hash_size, :hash_size]
+    medians = np.median(lowfreq.reshape(len(lowfreq), -1), axis=1)
+    return pack_bits(lowfreq > medians[:, np.newaxis, np.newaxis])
+
+
+def hash_frames(frames: Sequence[np.ndarray], algorithm: str = 'ahash') -> np.ndarray:
+    """
+    Hashes a batch of decoded frames with the given algorithm.
+
+    :param frames: A sequence of equally sized BGR or grayscale frames.
+    :param algorithm: One of 'ahash', 'dhash' or 'phash'.
+    :return: A uint64 array with one hash per frame.
+    :raises ValueError: If the algorithm is not supported.
+    """
+    if algorithm == 'ahash':
+        return average_hash(frames)
+    elif algorithm == 'dhash':
+        return difference_hash(frames)
+    elif algorithm == 'phash':
+        return perceptual_hash(frames)
+    else:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
@@ -0,0 +1,129 @@
+import time
+import random
+from typing import Dict, List, Iterable, Optional
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    Returns the number of bits that differ between two integer hashes.
+
+    :param a: The first hash.
+    :param b: The second hash.
+    :return: The Hamming distance.
+    """
+    return bin(a ^ b).count('1')
+
+
+class HashIndex:
+    def __init__(self, max_distance: int = 5, bits: int = 64) -> None:
+        """
+        Initialize a multi-index hash table for Hamming-space neighbour queries.
+
+        The hash is split into max_distance + 1 disjoint bit ranges, each with its own lookup table. Two hashes
+        within max_distance of each other must agree exactly on at least one range, so a query only has to
+        compare against the hashes sharing one of its range values instead of every stored hash.
+
+        :param max_distance: The largest distance a query may ask for.
+        :param bits: The number of bits in each hash.
+        """
+        self.max_distance = max_distance
+        self.bits = bits
+        chunks = min(max_distance + 1, bits)
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        self.ranges = [(bounds[i], (1 << (bounds[i + 1] - bounds[i])) - 1) for i in range(chunks)]
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self.hashes = set()
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, value: int) -> bool:
+        return value in self.hashes
+
+    def _keys(self, value: int) -> Iterable[int]:
+        for shift, mask in self.ranges:
+            yield (value >> shift) & mask
+
+    def add(self, value: int) -> None:
+        """
+        Adds a hash to the index.
+
+        :param value: The hash as an unsigned integer.
+        """
+        if value in self.hashes:
+            return
+        self.hashes.add(value)
+        for table, key in zip(self.tables, self._keys(value)):
+            table.setdefault(key, []).append(value)
+
+    def _candidates(self, value: int, distance: int):
+        if distance > self.max_distance:
+            raise ValueError(f"Distance {distance} is larger than the index maximum of {self.max_distance}")
+        seen = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            for candidate in table.get(key, ()):
+                if candidate not in seen:
+                    seen.add(candidate)
+                    yield candidate
+
+    def find_within(self, value: int, distance: Optional[int] = None) -> List[int]:
+        """
+        Returns every stored hash within a Hamming distance of a hash.
+
+        :param value: The hash to look up.
+        :param distance: The maximum distance (defaults to max_distance).
+        :return: The matching hashes.
+        """
+        distance = self.max_distance if distance is None else distance
+        return [candidate for candidate in self._candidates(value, distance)
+                if hamming_distance(value, candidate) <= distance]
+
+    def any_within(self, value: int, distance: Optional[int] = None) -> bool:
+        """
+        Checks whether any stored hash is within a Hamming distance of a hash.
+
+        :param value: The hash to look up.
+        :param distance: The maximum distance (defaults to max_distance).
+        :return: True if a neighbour exists, False otherwise.
+        """
+        distance = self.max_distance if distance is None else distance
+        for candidate in self._candidates(value, distance):
+            if hamming_distance(value, candidate) <= distance:
+                return True
+        return False
+
+
+def benchmark(sizes=(1000, 10000, 100000), queries: int = 1000, distance: int = 5) -> None:
+    """
+    Compares HashIndex lookups with a linear scan over random 64-bit hashes and prints the timings.
+
+    :param sizes: The numbers of stored hashes to benchmark.
+    :param queries: The number of lookups per size.
+    :param distance: The query distance.
+    """
+    rng = random.Random(0)
+    for size in sizes:
+        stored = [rng.getrandbits(64) for _ in range(size)]
+        # Half of the queries have a near neighbour, half are random
+        probes = [stored[rng.randrange(size)] ^ (1 << rng.randrange(64)) for _ in range(queries // 2)]
+        probes += [rng.getrandbits(64) for _ in range(queries - len(probes))]
+
+        index = HashIndex(max_distance=distance)
+        for value in stored:
+            index.add(value)
+
+        start = time.perf_counter()
+        indexed = [index.any_within(probe, distance) for probe in probes]
+        index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scanned = [any(hamming_distance(probe, value) <= distance for value in stored) for probe in probes]
+        scan_time = time.perf_counter() - start
+
+        assert indexed == scanned
+        print(f"{size:>7} hashes: index {index_time * 1e6 / queries:10.1f} us/query, "
+              f"linear scan {scan_time * 1e6 / queries:10.1f} us/query ({scan_time / index_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,127 @@
+import re
+import time
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Any, Dict
+
+
+# Only these are retried: repeating them can't create a duplicate listing, photo or log entry
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DriverSession(requests.Session):
+    IDEMPOTENT_METHODS = IDEMPOTENT_METHODS
+    RETRY_STATUSES = RETRY_STATUSES
+
+    def __init__(self, base_url: str, pool_size: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, retries: int = 3, backoff_factor: float = 0.5) -> None:
+        """
+        Initialize a connection-pooled session with default timeouts, retries and per-endpoint metrics.
+
+        Idempotent requests are retried with exponential backoff on connection errors and on the statuses in
+        RETRY_STATUSES; POST requests are sent once. A request that reached the server but whose response was
+        lost is never retried, since GET videos/get and listings/get hand work out and a replay would lose it.
+        Every request made through the session, including the streaming downloads, is timed and counted under
+        its endpoint.
+
+        :param base_url: Base URL of the API, used to name endpoints in the metrics.
+        :param pool_size: Maximum number of keep-alive connections kept per host.
+        :param connect_timeout: Seconds to wait for a connection to be established.
+        :param read_timeout: Seconds to wait for the server between two bytes of the response.
+        :param retries: Number of retries of a failed idempotent request.
+        :param backoff_factor: Base of the exponential backoff between retries, in seconds.
+        """
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.pool_size = 0
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+        self._metrics_lock = threading.Lock()
+        # Optional Metrics instance every request is also exported to
+        self.observer = None
+        self.resize(pool_size)
+
+    def resize(self, pool_size: int) -> None:
+        """
+        Grows the connection pool to at least pool_size connections per host; it never shrinks.
+
+        :param pool_size: The number of connections needed.
+        """
+        if pool_size <= self.pool_size:
+            return
+        self.pool_size = pool_size
+        retry = Retry(total=self.retries, connect=self.retries, read=0, status=self.retries,
+                      backoff_factor=self.backoff_factor, status_forcelist=self.RETRY_STATUSES,
+                      allowed_methods=self.IDEMPOTENT_METHODS, raise_on_status=False)
+        for prefix in ('http://', 'https://'):
+            self.mount(prefix, HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry))
+
+    def endpoint(self, url: str) -> str:
+        """
+        Returns the metrics name of a URL: the API path with its IDs replaced by {id}, or the host for
+        URLs outside the API.
+
+        :param url: The requested URL.
+        :return: The endpoint name.
+        """
+        if not url.startswith(self.base_url + '/'):
+            return urlsplit(url).netloc
+        path = url[len(self.base_url) + 1:].split('?')[0]
+        return '/'.join('{id}' if re.search(r'\d', part) else part for part in path.split('/'))
+
+    def _record(self, endpoint: str, seconds: float, failed: bool) -> None:
+        with self._metrics_lock:
+            stats = self.metrics.setdefault(endpoint, {'requests': 0, 'errors': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stats['requests'] += 1
+            stats['errors'] += int(failed)
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        if self.observer is not None:
+            self.observer.record_request(endpoint, seconds, failed)
+
+    def record(self, method: str, url: str, seconds: float, failed: bool) -> None:
+        """
+        Records a request under its endpoint, for requests sent outside the session such as the async client's.
+
+        :param method: The HTTP method.
+        :param url: The requested URL.
+        :param seconds: The latency of the request.
+        :param failed: Whether the request raised or got an error status.
+        """
+        self._record(f"{method.upper()} {self.endpoint(url)}", seconds, failed)
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        """
+        Sends a request with the session's default timeout and records its latency under its endpoint.
+
+        The latency covers the time until the response headers arrive, retries included; the body of a
+        streamed response is read afterwards by the caller.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = f"{method.upper()} {self.endpoint(url)}"
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except requests.RequestException:
+            self._record(endpoint, time.perf_counter() - start, True)
+            raise
+        self._record(endpoint, time.perf_counter() - start, response.status_code >= 400)
+        return response
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns a snapshot of the per-endpoint metrics.
+
+        :return: For every endpoint, its request and error counts and its average and maximum latency in seconds.
+        """
+        with self._metrics_lock:
+            return {
+                endpoint: {**stats, 'avg_seconds': stats['seconds'] / stats['requests']}
+                for endpoint, stats in self.metrics.items()
+            }
@@ -0,0 +1,141 @@
+import json
+import time
+import random
+import argparse
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Tuple
+from driver import Driver
+from mock_backend import MockBackend
+
+# One pass of the backend calls the bot makes, as (endpoint name, call) pairs, in workflow order
+Call = Callable[[Driver, random.Random], Any]
+SCENARIO: List[Tuple[str, Call]] = [
+    ('GET listings/remove', lambda driver, rng: driver.send_http_request('GET', 'listings/remove')),
+    ('POST listings/{id}/droped', lambda driver, rng: driver.send_http_request('POST', f"listings/{rng.randint(1, 9)}/droped", {'state': 'droped'})),
+    ('GET listings/get', lambda driver, rng: driver.send_http_request('GET', 'listings/get')),
+    ('GET locations/{id}/get', lambda driver, rng: driver.send_http_request('GET', f"locations/{rng.randint(1, 999)}/get")),
+    ('POST listings/{id}/published', lambda driver, rng: driver.send_http_request('POST', f"listings/{rng.randint(1, 999)}/published", {'state': 'published', 'location': 1})),
+    ('GET accounts/toupdate', lambda driver, rng: driver.send_http_request('GET', 'accounts/toupdate')),
+    ('POST accounts/{id}/update', lambda driver, rng: driver.send_http_request('POST', f"accounts/{rng.randint(1, 9)}/update", {'title': 'Listing', 'clicks': str(rng.randint(0, 99)), 'location': 'Alger'})),
+    ('GET videos/get', lambda driver, rng: driver.send_http_request('GET', 'videos/get')),
+    ('POST photos/{id}/add', lambda driver, rng: driver.send_http_request('POST', f"photos/{rng.randint(1, 9)}/add", {'photo': ('frame.jpg', rng.randbytes(20 * 1024))}, files=True)),
+    ('POST logs/add', lambda driver, rng: driver.send_http_request('POST', 'logs/add', {'logs': [{'type': 'info', 'content': 'Load test.'}] * 50})),
+]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns a percentile of a list of values, interpolating between the closest ranks.
+
+    :param values: The values, sorted in ascending order.
+    :param fraction: The percentile, from 0 to 1.
+    :return: The percentile.
+    """
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def worker(driver: Driver, deadline: float, seed: int, results: Dict[str, Dict[str, list]], lock: threading.Lock) -> None:
+    """
+    Runs the scenario in a loop until the deadline, timing every call.
+
+    :param driver: The driver whose session sends the requests.
+    :param deadline: The time.perf_counter() value to stop at.
+    :param seed: The random seed of this worker.
+    :param results: Latencies and error counts per endpoint, shared by every worker.
+    :param lock: Guards results.
+    """
+    rng = random.Random(seed)
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    while time.perf_counter() < deadline:
+        for endpoint, call in SCENARIO:
+            start = time.perf_counter()
+            try:
+                call(driver, rng)
+            except Exception:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+    with lock:
+        for endpoint, values in latencies.items():
+            stats = results.setdefault(endpoint, {'latencies': [], 'errors': [0]})
+            stats['latencies'].extend(values)
+            stats['errors'][0] += errors.get(endpoint, 0)
+
+
+def run(backend: MockBackend, drivers: int, threads: int, duration: float, **driver_options) -> Dict[str, Any]:
+    """
+    Runs Driver instances against a mock backend and measures every endpoint.
+
+    :param backend: The running mock backend.
+    :param drivers: Number of Driver instances, each with its own connection pool.
+    :param threads: Number of threads running the scenario per driver.
+    :param duration: Seconds to run for.
+    :param driver_options: Keyword arguments for Driver.
+    :return: Requests per second, error counts and latency percentiles in milliseconds for each endpoint.
+    """
+    instances = [Driver(backend.url, ship_logs=False, **driver_options) for _ in range(drivers)]
+    results: Dict[str, Dict[str, list]] = {}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+    workers = []
+    for number, driver in enumerate(instances):
+        for index in range(threads):
+            thread = threading.Thread(target=worker, args=(driver, deadline, number * threads + index, results, lock), daemon=True)
+            thread.start()
+            workers.append(thread)
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {}
+    total = 0
+    for endpoint, _ in SCENARIO:
+        values = sorted(results.get(endpoint, {}).get('latencies', []))
+        if not values:
+            continue
+        total += len(values)
+        report[endpoint] = {
+            'requests': len(values),
+            'errors': results[endpoint]['errors'][0],
+            'rps': round(len(values) / elapsed, 1),
+            **{f'p{int(fraction * 100)}_ms': round(percentile(values, fraction) * 1000, 2) for fraction in (0.5, 0.9, 0.99)},
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    return {'seconds': round(elapsed, 2), 'requests': total, 'rps': round(total / elapsed, 1), 'endpoints': report}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test Driver instances against the local mock backend.")
+    parser.add_argument('--drivers', type=int, default=1, help="Number of Driver instances.")
+    parser.add_argument('--threads', type=int, default=4, help="Threads running the scenario per driver.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run for.")
+    parser.add_argument('--latency', default='0', help="Backend latency in seconds, or a JSON object per endpoint.")
+    parser.add_argument('--error-rate', default='0', help="Backend error rate from 0 to 1, or a JSON object per endpoint.")
+    parser.add_argument('--listings', type=int, default=20, help="Listings returned by listings/get.")
+    parser.add_argument('--pool-size', type=int, default=10, help="Connection pool size of each driver.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    backend = MockBackend(latency=json.loads(args.latency), error_rate=json.loads(args.error_rate),
+                          listings=args.listings, seed=args.seed)
+    with backend:
+        report = run(backend, args.drivers, args.threads, args.duration, pool_size=args.pool_size)
+    report['server_requests'] = backend.requests
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
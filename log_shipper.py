@@ -0,0 +1,159 @@
+import gzip
+import json
+import atexit
+import logging
+import threading
+import requests
+from collections import deque
+from typing import Any, Dict, List
+
+
+class LogShipper:
+    def __init__(self, driver, capacity: int = 10000, batch_size: int = 500, flush_interval: float = 5.0,
+                 compress: bool = True) -> None:
+        """
+        Initialize a background shipper of log entries to the backend's logs/add endpoint.
+
+        Entries go into a bounded ring buffer; when it is full the oldest entries are dropped, so logging never
+        blocks or grows memory without bound. A daemon thread posts the buffered entries as one JSON batch
+        every flush_interval seconds, or sooner once batch_size entries are waiting. Failed batches go back
+        to the front of the buffer. Whatever is left is flushed on close, which also runs at interpreter exit.
+
+        A backend that rejects the gzipped batches with a 4xx response gets them uncompressed, and one that
+        rejects those gets one entry per request, as logs/add originally took them. An entry rejected on its
+        own is dropped, since sending it again would fail forever.
+
+        :param driver: An instance of the Driver class, whose HTTP session and base URL are used.
+        :param capacity: Maximum number of entries held in memory.
+        :param batch_size: Maximum number of entries per request, and the count that triggers an early flush.
+        :param flush_interval: Seconds between two flushes.
+        :param compress: Whether to gzip the request bodies.
+        """
+        self.driver = driver
+        self.capacity = max(1, capacity)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.compress = compress
+        # Cleared the first time the backend rejects a batch
+        self.batch_supported = True
+        self.buffer = deque(maxlen=self.capacity)
+        self.dropped = 0
+        self.shipped = 0
+        self._lock = threading.Lock()
+        # Serializes flushes between the background thread and close
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='log-shipper', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def push(self, entry: Dict[str, Any]) -> None:
+        """
+        Adds a log entry to the buffer without blocking.
+
+        :param entry: The log entry.
+        """
+        with self._lock:
+            if len(self.buffer) == self.capacity:
+                self.dropped += 1
+            self.buffer.append(entry)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if not self._stop.is_set():
+                self.flush()
+
+    @staticmethod
+    def _rejected(error: requests.HTTPError) -> bool:
+        status = error.response.status_code if error.response is not None else None
+        return status is not None and 400 <= status < 500
+
+    def _post(self, payload: Dict[str, Any], compress: bool) -> None:
+        body = json.dumps(payload).encode()
+        headers = {'Content-Type': 'application/json'}
+        if compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        response = self.driver.session.post(f'{self.driver.url}/logs/add', data=body, headers=headers)
+        response.raise_for_status()
+
+    def _send(self, batch: List[Dict[str, Any]]) -> None:
+        """
+        Posts a batch, falling back to uncompressed batches and then to single entries on 4xx responses.
+
+        :param batch: The entries; on failure, the ones already handled are removed from it.
+        """
+        while self.batch_supported:
+            try:
+                self._post({'logs': batch}, self.compress)
+                self.shipped += len(batch)
+                return
+            except requests.HTTPError as e:
+                if not self._rejected(e):
+                    raise
+                if self.compress:
+                    logging.warning(f"Backend rejected a gzipped log batch ({e.response.status_code}), sending them uncompressed.")
+                    self.compress = False
+                else:
+                    logging.warning(f"Backend rejected a log batch ({e.response.status_code}), sending entries one by one.")
+                    self.batch_supported = False
+
+        sent = 0
+        try:
+            for entry in list(batch):
+                try:
+                    self._post(entry, False)
+                except requests.HTTPError as e:
+                    if not self._rejected(e):
+                        raise
+                    logging.warning(f"Backend rejected a log entry ({e.response.status_code}), dropping it.")
+                    with self._lock:
+                        self.dropped += 1
+                else:
+                    self.shipped += 1
+                sent += 1
+        finally:
+            # Only the entries that weren't handled are put back by flush
+            del batch[:sent]
+
+    def flush(self) -> bool:
+        """
+        Ships every buffered entry, batch_size entries per request.
+
+        Errors are logged locally only, since logging them remotely would feed the buffer that failed to ship.
+
+        :return: True if the buffer was emptied, False if a batch failed and was put back.
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                if not batch:
+                    return True
+                try:
+                    self._send(batch)
+                except Exception as e:
+                    with self._lock:
+                        # Put the batch back in front of newer entries, dropping its oldest ones if there's no room
+                        room = self.capacity - len(self.buffer)
+                        kept = batch[len(batch) - room:] if room < len(batch) else batch
+                        self.dropped += len(batch) - len(kept)
+                        self.buffer.extendleft(reversed(kept))
+                    logging.warning(f"Failed to ship {len(batch)} log entries: {e}")
+                    return False
+
+    def close(self) -> None:
+        """Stops the background thread and makes a final flush."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
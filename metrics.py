@@ -0,0 +1,230 @@
+import os
+import time
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Tuple
+
+# Upper bounds in seconds of the histogram buckets, from a fast backend call to a slow browser step
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+OPENMETRICS_CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _NullSpan:
+    """Stands in for a span when metrics are disabled, so instrumented code costs one method call."""
+    __slots__ = ()
+
+    @property
+    def failed(self) -> bool:
+        return False
+
+    @failed.setter
+    def failed(self, value: bool) -> None:
+        # The instance is shared, so it must not keep state
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, metrics: 'Metrics', name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+        # Set by the instrumented code to count a step that returned a failure without raising
+        self.failed = False
+        self.start = 0.0
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        seconds = time.perf_counter() - self.start
+        outcome = 'error' if exc_type is not None or self.failed else 'ok'
+        self.metrics.observe('fmap_step_duration_seconds', seconds, step=self.name)
+        self.metrics.inc('fmap_steps', step=self.name, outcome=outcome)
+
+
+class Metrics:
+    # Help text of every metric family, in the order they are exported
+    FAMILIES = {
+        'fmap_step_duration_seconds': ('histogram', "Time spent in each bot step."),
+        'fmap_steps': ('counter', "Bot steps run, by outcome."),
+        'fmap_http_request_duration_seconds': ('histogram', "Time until the backend's response headers arrive."),
+        'fmap_http_requests': ('counter', "Backend requests, by outcome."),
+        'fmap_webdriver_pool_events': ('counter', "WebDriver pool hits, misses, evictions and failed health checks."),
+    }
+
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Initialize the timing spans, histograms and counters of the bot.
+
+        When disabled, `span` returns a shared no-op context manager and nothing is recorded.
+
+        :param enabled: Whether to record anything.
+        :param buckets: Upper bounds in seconds of the histogram buckets.
+        """
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        # Per metric and label set: bucket counts, sum and count for histograms, the value for counters
+        self.histograms: Dict[str, Dict[Labels, list]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.server: Optional[ThreadingHTTPServer] = None
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        """
+        Returns a context manager timing one step into fmap_step_duration_seconds and counting it in fmap_steps.
+
+        The step counts as an error if it raises or if the caller sets `failed` on the span.
+
+        :param name: The name of the step.
+        :return: The span.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def observe(self, metric: str, value: float, **labels: str) -> None:
+        """
+        Records a value in a histogram.
+
+        :param metric: The name of the histogram.
+        :param value: The observed value.
+        :param labels: The labels of the series.
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.histograms.setdefault(metric, {}).get(key)
+            if series is None:
+                series = self.histograms[metric][key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def inc(self, metric: str, amount: float = 1, **labels: str) -> None:
+        """
+        Increments a counter.
+
+        :param metric: The name of the counter.
+        :param amount: The increment.
+        :param labels: The labels of the series.
+        """
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + amount
+
+    def record_request(self, endpoint: str, seconds: float, failed: bool) -> None:
+        """
+        Records one backend request.
+
+        :param endpoint: The endpoint name, such as 'GET listings/get'.
+        :param seconds: The time until the response headers arrived.
+        :param failed: Whether the request raised or got an error status.
+        """
+        if not self.enabled:
+            return
+        self.observe('fmap_http_request_duration_seconds', seconds, endpoint=endpoint)
+        self.inc('fmap_http_requests', endpoint=endpoint, outcome='error' if failed else 'ok')
+
+    @staticmethod
+    def _labels(key: Labels) -> str:
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}' if key else ''
+
+    def render(self, openmetrics: bool = True) -> str:
+        """
+        Returns every metric in the OpenMetrics text format, or in the older Prometheus text format.
+
+        :param openmetrics: Whether to use the OpenMetrics format; the Prometheus format names counter
+            families with their _total suffix and has no # EOF line.
+        :return: The exposition text.
+        """
+        lines = []
+        with self._lock:
+            for metric, (kind, help_text) in self.FAMILIES.items():
+                family = metric if openmetrics or kind != 'counter' else f'{metric}_total'
+                lines.append(f'# HELP {family} {help_text}')
+                lines.append(f'# TYPE {family} {kind}')
+                if kind == 'histogram':
+                    for key, (counts, total, count) in sorted(self.histograms.get(metric, {}).items()):
+                        cumulative = 0
+                        for bound, bucket in zip(self.buckets, counts):
+                            cumulative += bucket
+                            lines.append(f'{metric}_bucket{self._labels(key + (("le", bound),))} {cumulative}')
+                        lines.append(f'{metric}_bucket{self._labels(key + (("le", "+Inf"),))} {count}')
+                        lines.append(f'{metric}_sum{self._labels(key)} {total}')
+                        lines.append(f'{metric}_count{self._labels(key)} {count}')
+                else:
+                    for key, value in sorted(self.counters.get(metric, {}).items()):
+                        lines.append(f'{metric}_total{self._labels(key)} {value}')
+        if openmetrics:
+            lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Writes the metrics to a file for node_exporter's textfile collector, replacing it atomically.
+
+        :param path: The path of the .prom file.
+        """
+        if not self.enabled:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.render(openmetrics=False))
+        os.replace(temp_path, path)
+
+    def serve(self, port: int, host: str = '0.0.0.0') -> None:
+        """
+        Serves the metrics at http://host:port/metrics from a background thread.
+
+        Scrapers that accept OpenMetrics get it; others get the Prometheus text format.
+
+        :param port: The port to listen on.
+        :param host: The interface to listen on.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+                body = metrics.render(openmetrics).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
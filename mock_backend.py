@@ -0,0 +1,348 @@
+import os
+import re
+import gzip
+import json
+import time
+import random
+import threading
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# A setting given either for every endpoint or per endpoint name, with an optional 'default' key
+Setting = Union[float, Tuple[float, float], Dict[str, Any]]
+
+
+class MockBackend:
+    def __init__(self, files_dir: Optional[str] = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: Setting = 0.0, error_rate: Setting = 0.0, listings: int = 5, accounts: int = 2,
+                 photos_per_listing: int = 3, photo_size: int = 200 * 1024, file_rate: Optional[float] = None,
+                 batch_uploads: bool = True, seed: Optional[int] = None) -> None:
+        """
+        Initialize a local stand-in for the fmap API.
+
+        It serves every endpoint the Driver, VideoFrameExtractor and Facebook call, and exposes the files in
+        files_dir under /files/, with HTTP Range and If-Range support, so videos can be downloaded from it. Listing photos
+        are generated on the fly under /photos/.
+
+        Latency and error rates are given either as one value for every endpoint or as a dictionary keyed by
+        endpoint name (e.g. 'listings/get' or 'locations/{id}/get'), with an optional 'default' key. A latency
+        may be a (min, max) tuple, in which case every response waits a uniformly random time in that range.
+
+        :param files_dir: Optional directory whose files are served under /files/.
+        :param host: The interface to listen on.
+        :param port: The port to listen on; 0 picks a free one.
+        :param latency: Seconds each response is delayed by.
+        :param error_rate: Probability, from 0 to 1, of answering with a 503 instead.
+        :param listings: Number of listings returned by listings/get.
+        :param accounts: Number of accounts returned by accounts/toupdate and listings/remove.
+        :param photos_per_listing: Number of photo URLs in each listing.
+        :param photo_size: Size in bytes of each generated photo.
+        :param file_rate: Optional bandwidth in bytes per second of each connection serving /files/, like a CDN
+            capping its connections; None serves files as fast as possible.
+        :param batch_uploads: Whether photos/{id}/add accepts several photos as `photos[]` fields; when False it
+            answers 400 to them, like a backend that only knows single `photo` uploads.
+        :param seed: Optional random seed, so latencies and errors are reproducible.
+        """
+        self.files_dir = files_dir
+        self.latency = latency
+        self.error_rate = error_rate
+        self.listings = listings
+        self.accounts = accounts
+        self.photos_per_listing = photos_per_listing
+        self.photo_size = photo_size
+        self.file_rate = file_rate
+        self.batch_uploads = batch_uploads
+        self.random = random.Random(seed)
+        self.videos: List[Dict[str, Any]] = []
+        self.photos: Dict[str, Dict[str, int]] = {}
+        self.published: List[str] = []
+        self.listing_states: Dict[str, Dict[str, Any]] = {}
+        self.account_updates: Dict[str, List[Dict[str, Any]]] = {}
+        self.logs: List[Dict[str, Any]] = []
+        # Number of requests served per endpoint name
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.routes = [
+            (method, name, re.compile(re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', f'/api/v1/{name}')), handler)
+            for method, name, handler in [
+                ('GET', 'videos/get', self.get_videos),
+                ('POST', 'videos/{id}/published', self.video_published),
+                ('POST', 'photos/{id}/add', self.add_photos),
+                ('GET', 'photos/{id}/hashes', self.get_photo_hashes),
+                ('GET', 'listings/get', self.get_listings),
+                ('GET', 'listings/remove', self.get_accounts),
+                ('POST', 'listings/{id}/published', self.listing_state),
+                ('POST', 'listings/{id}/unpublished', self.listing_state),
+                ('POST', 'listings/{id}/droped', self.listing_state),
+                ('GET', 'locations/{id}/get', self.get_location),
+                ('GET', 'accounts/toupdate', self.get_accounts),
+                ('POST', 'accounts/{id}/update', self.update_account),
+                ('POST', 'logs/add', self.add_logs),
+            ]
+        ]
+        self.server = ThreadingHTTPServer((host, port), self._handler(), bind_and_activate=False)
+        self.server.daemon_threads = True
+        # Many clients connect at once in load tests
+        self.server.request_queue_size = 128
+        self.server.server_bind()
+        self.server.server_activate()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base URL of the API, to pass to Driver."""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/api/v1'
+
+    def file_url(self, filename: str) -> str:
+        """
+        Returns the URL a file of files_dir is served at.
+
+        :param filename: The name of the file.
+        :return: The URL.
+        """
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/files/{filename}'
+
+    def photo_url(self, name: str) -> str:
+        """
+        Returns the URL of a generated photo.
+
+        :param name: The name of the photo.
+        :return: The URL.
+        """
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/photos/{name}.jpg'
+
+    def start(self) -> 'MockBackend':
+        """Starts serving in a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the server and closes its socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'MockBackend':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def _setting(self, setting: Setting, name: str) -> float:
+        if isinstance(setting, dict):
+            setting = setting.get(name, setting.get('default', 0.0))
+        if isinstance(setting, (tuple, list)):
+            return self.random.uniform(*setting)
+        return setting
+
+    def account(self, number: int) -> Dict[str, Any]:
+        """
+        Returns a generated account.
+
+        :param number: The account number.
+        :return: The account, as the backend describes it.
+        """
+        return {'id': number, 'facebook_user_id': f'1000{number:05d}', 'username': f'account{number}@example.com',
+                'password': 'password', 'total_listings': self.listings}
+
+    def get_videos(self, request, body: bytes, **params):
+        """GET videos/get: hands out the queued videos once."""
+        with self.lock:
+            videos, self.videos = self.videos, []
+        return 200, videos
+
+    def video_published(self, request, body: bytes, id: str):
+        """POST videos/{id}/published: records the video as done."""
+        with self.lock:
+            self.published.append(id)
+        return 200, {'state': 'published'}
+
+    def add_photos(self, request, body: bytes, id: str):
+        """POST photos/{id}/add: counts the photos of single (`photo`) and batch (`photos[]`) uploads."""
+        batch = body.count(b'name="photos[]"')
+        if batch and not self.batch_uploads:
+            return 400, {'error': 'Unknown field photos[].'}
+        count = body.count(b'name="photo"') + batch
+        if not count:
+            return 422, {'error': 'No photo was sent.'}
+        with self.lock:
+            stats = self.photos.setdefault(id, {'photos': 0, 'requests': 0, 'bytes': 0})
+            stats['photos'] += count
+            stats['requests'] += 1
+            stats['bytes'] += len(body)
+        return 200, {'added': count}
+
+    def get_photo_hashes(self, request, body: bytes, id: str):
+        """GET photos/{id}/hashes: the mock keeps no frame hashes."""
+        return 200, []
+
+    def get_listings(self, request, body: bytes, **params):
+        """GET listings/get: generated listings spread over the accounts."""
+        listings = []
+        for number in range(1, self.listings + 1):
+            listings.append({
+                'id': number,
+                'posting_id': str(number),
+                'account': self.account((number - 1) % max(1, self.accounts) + 1),
+                'photos': [{'photo': {'photo': self.photo_url(f'{number}-{index}')}} for index in range(self.photos_per_listing)],
+                # Each field is an object of its own, as create_listing reads them
+                'title': {'title': f'Listing {number}'},
+                'postings_price': {'price': str(1000 * number)},
+                'category': {'category': 'Miscellaneous'},
+                'condition': {'condition': 'New'},
+                'description': {'description': f'Description of listing {number}.'},
+                'availability': {'availability': 'In stock'},
+                'tags': {'tags': 'mock'},
+            })
+        return 200, {'listings': listings}
+
+    def get_accounts(self, request, body: bytes, **params):
+        """GET accounts/toupdate and listings/remove: the generated accounts."""
+        return 200, [self.account(number) for number in range(1, self.accounts + 1)]
+
+    def listing_state(self, request, body: bytes, id: str):
+        """POST listings/{id}/published, unpublished and droped: records the new state."""
+        data = json.loads(body or b'{}')
+        with self.lock:
+            self.listing_states[id] = data
+        return 200, {'state': data.get('state')}
+
+    def get_location(self, request, body: bytes, id: str):
+        """GET locations/{id}/get: a location for the posting."""
+        return 200, {'id': int(id) if id.isdigit() else id, 'name': f'Commune {id}', 'wilaya': {'name': 'Alger'}}
+
+    def update_account(self, request, body: bytes, id: str):
+        """POST accounts/{id}/update: single listing statistics or a {"listings": [...]} batch."""
+        data = json.loads(body or b'{}')
+        records = data['listings'] if 'listings' in data else [data]
+        with self.lock:
+            self.account_updates.setdefault(id, []).extend(records)
+        return 200, {'updated': len(records)}
+
+    def add_logs(self, request, body: bytes, **params):
+        """POST logs/add: a single entry or a {"logs": [...]} batch, optionally gzipped."""
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        data = json.loads(body or b'{}')
+        entries = data['logs'] if 'logs' in data else [data]
+        with self.lock:
+            self.logs.extend(entries)
+        return 200, {'added': len(entries)}
+
+    def _handler(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately; Nagle's algorithm would hold the body for ~40 ms
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, payload: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            def _send_json(self, status: int, response: Any) -> None:
+                self._send(status, json.dumps(response).encode(), {'Content-Type': 'application/json'})
+
+            def _send_file(self) -> None:
+                name = os.path.basename(self.path[len('/files/'):])
+                path = os.path.join(backend.files_dir or '', name)
+                if not backend.files_dir or not os.path.isfile(path):
+                    return self._send(404, b'')
+                stat = os.stat(path)
+                size = stat.st_size
+                etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+                last_modified = formatdate(stat.st_mtime, usegmt=True)
+                start, end, status = 0, size - 1, 200
+                match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+                if_range = self.headers.get('If-Range')
+                if match and if_range is not None and if_range not in (etag, last_modified):
+                    # The client's copy is of another version of the file: send all of it
+                    match = None
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+                    if start >= size:
+                        return self._send(416, b'', {'Content-Range': f'bytes */{size}'})
+                    status = 206
+                headers = {'Accept-Ranges': 'bytes', 'Content-Type': 'application/octet-stream',
+                           'ETag': etag, 'Last-Modified': last_modified}
+                if status == 206:
+                    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+                with open(path, 'rb') as file:
+                    file.seek(start)
+                    payload = file.read(end - start + 1)
+                if not backend.file_rate or self.command == 'HEAD':
+                    return self._send(status, payload, headers)
+                self._send_paced(status, payload, headers, backend.file_rate)
+
+            def _send_paced(self, status: int, payload: bytes, headers: Dict[str, str], rate: float) -> None:
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                # Twenty writes per second keep the pace smooth without a syscall per byte
+                chunk_size = max(1, int(rate / 20))
+                started = time.perf_counter()
+                try:
+                    for offset in range(0, len(payload), chunk_size):
+                        self.wfile.write(payload[offset:offset + chunk_size])
+                        delay = started + (offset + chunk_size) / rate - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the download
+                    self.close_connection = True
+
+            def _send_photo(self) -> None:
+                name = os.path.basename(self.path.split('?')[0])
+                etag = f'"{name}-{backend.photo_size}"'
+                with backend.lock:
+                    backend.requests['photos'] = backend.requests.get('photos', 0) + 1
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, b'', {'ETag': etag})
+                # Deterministic bytes per name, so the same URL always serves the same photo
+                content = random.Random(name).randbytes(backend.photo_size)
+                self._send(200, content, {'Content-Type': 'image/jpeg', 'ETag': etag,
+                                          'Last-Modified': 'Thu, 01 Jan 2026 00:00:00 GMT'})
+
+            def _dispatch(self) -> None:
+                if self.path.startswith('/files/') and self.command in ('GET', 'HEAD'):
+                    return self._send_file()
+                if self.path.startswith('/photos/') and self.command in ('GET', 'HEAD'):
+                    return self._send_photo()
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                path = self.path.split('?')[0]
+                for method, name, pattern, handler in backend.routes:
+                    match = pattern.fullmatch(path)
+                    if method != self.command or not match:
+                        continue
+                    with backend.lock:
+                        backend.requests[name] = backend.requests.get(name, 0) + 1
+                        delay = backend._setting(backend.latency, name)
+                        failed = backend.random.random() < backend._setting(backend.error_rate, name)
+                    if delay:
+                        time.sleep(delay)
+                    if failed:
+                        return self._send_json(503, {'error': 'Injected failure'})
+                    status, response = handler(self, body, **match.groupdict())
+                    return self._send_json(status, response)
+                self._send_json(404, {'error': 'Not found'})
+
+            do_GET = do_POST = do_HEAD = _dispatch
+
+        return Handler
@@ -0,0 +1,242 @@
+import os
+import time
+import sqlite3
+import hashlib
+import mimetypes
+import threading
+from urllib.parse import urlsplit
+from contextlib import closing
+from typing import Dict, Iterable, Optional
+from downloader import StreamDownloader
+
+# Extensions kept from a photo's URL; any other URL is named after its Content-Type
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+
+
+def photo_extension(url: str, content_type: Optional[str]) -> str:
+    """
+    Returns the file extension a photo is stored under, so the browser's file input sees its real type.
+
+    :param url: The URL of the photo.
+    :param content_type: The Content-Type header of the response, if any.
+    :return: The extension of the URL if it is an image one, else the one of the Content-Type, else '.jpg'.
+    """
+    extension = os.path.splitext(urlsplit(url).path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return extension
+    extension = mimetypes.guess_extension((content_type or '').split(';')[0].strip().lower())
+    return extension if extension in IMAGE_EXTENSIONS else '.jpg'
+
+
+class PhotoCache:
+    def __init__(self, driver, directory: str = "data/photo_cache", max_bytes: int = 1024 ** 3,
+                 max_age: float = 3600.0, chunk_size: int = 256 * 1024,
+                 max_photo_size: Optional[int] = 50 * 1024 * 1024) -> None:
+        """
+        Initialize an on-disk cache of listing photos, keyed by URL and stored by content hash.
+
+        Each photo is stored once under its SHA-256, however many URLs point to it. A URL fetched less than
+        max_age seconds ago is served from disk without any request; an older one is revalidated with its
+        ETag and Last-Modified headers, so an unchanged photo costs a 304 and no body bytes. Once the cache
+        grows past max_bytes, the least recently used photos are evicted, except those of pinned URLs, which
+        stay on disk until the browser has read them.
+
+        Photos are downloaded with a StreamDownloader, like videos, so they get its size cap, its checksum and
+        the resumption of an interrupted download.
+
+        :param driver: An instance of the Driver class, used for logging and its HTTP session.
+        :param directory: The directory holding the photos and the SQLite index.
+        :param max_bytes: Maximum total size of the cached photos.
+        :param max_age: Seconds during which a cached URL is used without revalidation.
+        :param chunk_size: Number of bytes read from the socket and written to disk at a time.
+        :param max_photo_size: Optional maximum size in bytes of one photo; larger photos are not downloaded.
+        """
+        self.driver = driver
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.downloader = StreamDownloader(driver, chunk_size=chunk_size, max_size=max_photo_size,
+                                           checksum_algorithm='sha256', session=driver.session)
+        self.index_path = os.path.join(directory, "index.sqlite3")
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        # Pinned URLs, with the number of holders of each pin
+        self.pins: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # A URL is fetched by one thread at a time, since its partial download is shared
+        self._fetch_locks = [threading.Lock() for _ in range(64)]
+        os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS urls ("
+                "url TEXT PRIMARY KEY, "
+                "sha256 TEXT NOT NULL, "
+                "etag TEXT, "
+                "last_modified TEXT, "
+                "validated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, "
+                "last_used REAL NOT NULL, "
+                "extension TEXT NOT NULL DEFAULT '.jpg')"
+            )
+            if 'extension' not in [row[1] for row in connection.execute("PRAGMA table_info(blobs)")]:
+                # Caches created before photos kept their extension hold only .jpg files
+                connection.execute("ALTER TABLE blobs ADD COLUMN extension TEXT NOT NULL DEFAULT '.jpg'")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def blob_path(self, sha256: str, extension: str = '.jpg') -> str:
+        """
+        Returns the path a photo is stored at.
+
+        :param sha256: The SHA-256 of the photo.
+        :param extension: The extension of the photo, from photo_extension.
+        :return: The absolute path.
+        """
+        return os.path.abspath(os.path.join(self.directory, sha256[:2], f"{sha256}{extension}"))
+
+    def get(self, url: str) -> str:
+        """
+        Returns the local path of a photo, downloading or revalidating it only when needed.
+
+        :param url: The URL of the photo.
+        :return: The absolute path of the cached photo.
+        :raises: requests.exceptions.RequestException if the photo can't be downloaded.
+        :raises: DownloadError if the download is truncated or the photo is larger than max_photo_size.
+        """
+        with self._fetch_locks[hash(url) % len(self._fetch_locks)]:
+            return self._get(url)
+
+    def _get(self, url: str) -> str:
+        with closing(self._connect()) as connection:
+            entry = connection.execute(
+                "SELECT urls.sha256, blobs.extension, urls.etag, urls.last_modified, urls.validated_at "
+                "FROM urls JOIN blobs ON blobs.sha256 = urls.sha256 WHERE urls.url = ?", (url,)
+            ).fetchone()
+
+        headers = {}
+        if entry and os.path.exists(self.blob_path(entry[0], entry[1])):
+            sha256, extension, etag, last_modified, validated_at = entry
+            if time.time() - validated_at < self.max_age:
+                self.hits += 1
+                return self._use(url, sha256, extension, etag, last_modified, validated_at)
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        # Named after the URL, so an interrupted download is resumed by the next call
+        download_path = os.path.join(self.directory, f"{hashlib.sha1(url.encode()).hexdigest()}.download")
+        result = self.downloader.download(url, download_path, headers=headers)
+        if result['not_modified']:
+            self.revalidated += 1
+            self.driver.record_log('info', f"Cached photo still valid: {url}")
+            return self._use(url, entry[0], entry[1], entry[2], entry[3], time.time())
+
+        sha256 = result['checksum']
+        extension = photo_extension(url, result['headers'].get('Content-Type'))
+        path = self.blob_path(sha256, extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Same content under another URL is already on disk; keep the existing copy
+        with closing(self._connect()) as connection:
+            stored = connection.execute("SELECT extension FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if stored and os.path.exists(self.blob_path(sha256, stored[0])):
+            extension = stored[0]
+            os.remove(download_path)
+        else:
+            os.replace(download_path, path)
+        self.misses += 1
+        self.driver.record_log('info', f"Photo downloaded to cache from {url}")
+        return self._use(url, sha256, extension, result['headers'].get('ETag'),
+                         result['headers'].get('Last-Modified'), time.time(), result['size'])
+
+    def _use(self, url: str, sha256: str, extension: str, etag: Optional[str], last_modified: Optional[str],
+             validated_at: float, size: Optional[int] = None) -> str:
+        # A new blob is indexed together with its URL, so an eviction in between can't miss its pin
+        with self._lock, closing(self._connect()) as connection, connection:
+            if size is not None:
+                connection.execute(
+                    "INSERT OR REPLACE INTO blobs (sha256, size, last_used, extension) VALUES (?, ?, ?, ?)",
+                    (sha256, size, time.time(), extension)
+                )
+            connection.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, validated_at) VALUES (?, ?, ?, ?, ?)",
+                (url, sha256, etag, last_modified, validated_at)
+            )
+            connection.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+        self.evict(keep=sha256)
+        return self.blob_path(sha256, extension)
+
+    def pin(self, urls: Iterable[str]) -> None:
+        """
+        Keeps the photos of URLs from being evicted until they are unpinned, including photos not fetched yet.
+
+        Pins are counted, so each pin must be matched by one unpin.
+
+        :param urls: The URLs of the photos.
+        """
+        with self._lock:
+            for url in urls:
+                self.pins[url] = self.pins.get(url, 0) + 1
+
+    def unpin(self, urls: Iterable[str]) -> None:
+        """
+        Releases pins taken with pin.
+
+        :param urls: The URLs of the photos.
+        """
+        with self._lock:
+            for url in urls:
+                count = self.pins.get(url, 0) - 1
+                if count > 0:
+                    self.pins[url] = count
+                else:
+                    self.pins.pop(url, None)
+
+    def size(self) -> int:
+        """Returns the total size in bytes of the cached photos."""
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Deletes the least recently used photos until the cache fits in max_bytes.
+
+        Photos of pinned URLs are never evicted.
+
+        :param keep: Optional SHA-256 of a photo that must not be evicted, such as the one being returned.
+        :return: The number of photos evicted.
+        """
+        evicted = 0
+        with self._lock, closing(self._connect()) as connection, connection:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            kept = {keep}
+            if self.pins:
+                urls = list(self.pins)
+                kept.update(row[0] for row in connection.execute(
+                    f"SELECT sha256 FROM urls WHERE url IN ({','.join('?' * len(urls))})", urls
+                ))
+            rows = connection.execute("SELECT sha256, size, extension FROM blobs ORDER BY last_used").fetchall()
+            for sha256, size, extension in rows:
+                if total <= self.max_bytes:
+                    break
+                if sha256 in kept:
+                    continue
+                path = self.blob_path(sha256, extension)
+                if os.path.exists(path):
+                    os.remove(path)
+                connection.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+                connection.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+                total -= size
+                evicted += 1
+        if evicted:
+            self.driver.record_log('info', f"Evicted {evicted} photos from the cache.")
+        return evicted
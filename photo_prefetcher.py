@@ -0,0 +1,80 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+
+class PhotoPrefetcher:
+    def __init__(self, driver, lookahead: int = 2, workers: int = 4) -> None:
+        """
+        Initialize a prefetcher that downloads the photos of upcoming listings into the driver's photo cache.
+
+        Use it as a context manager around a batch of listings and call `schedule` before each one; leaving
+        the block cancels the photos that haven't started downloading. Scheduled photos are pinned in the cache
+        until `get` hands them out or the block is left, so evictions can't remove them in between.
+
+        :param driver: An instance of the Driver class, whose photo cache stores the photos.
+        :param lookahead: Number of listings after the current one whose photos are fetched ahead.
+        :param workers: Number of threads downloading photos.
+        """
+        self.driver = driver
+        self.lookahead = max(0, lookahead)
+        self.workers = max(1, workers)
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.futures: Dict[str, Future] = {}
+
+    def __enter__(self) -> 'PhotoPrefetcher':
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.driver.photo_cache.unpin(self.futures)
+        self.futures.clear()
+
+    @staticmethod
+    def photo_urls(listing: Dict[str, Any]) -> List[str]:
+        """
+        Returns the photo URLs of a listing, in the shape add_pictures reads them.
+
+        :param listing: The listing.
+        :return: The URLs.
+        """
+        return [picture["photo"]["photo"] for picture in listing.get("photos", [])]
+
+    def schedule(self, listings: List[Dict[str, Any]], index: int) -> None:
+        """
+        Starts downloading the photos of the current listing and of the next `lookahead` ones.
+
+        The current listing's photos are queued first, so they are the first to be ready. A listing whose
+        photos are malformed is skipped here; add_pictures reports the error when its turn comes.
+
+        :param listings: The listings of the batch.
+        :param index: The index of the listing about to be processed.
+        """
+        for listing in listings[index:index + self.lookahead + 1]:
+            try:
+                for url in self.photo_urls(listing):
+                    if url not in self.futures:
+                        self.driver.photo_cache.pin([url])
+                        self.futures[url] = self.executor.submit(self.driver.photo_cache.get, url)
+            except (KeyError, TypeError) as e:
+                self.driver.record_log('error', f"Can't prefetch the photos of listing {listing.get('id', 'unknown')}: {e}")
+
+    def get(self, url: str) -> str:
+        """
+        Returns the cached path of a photo, waiting only for its own download.
+
+        The prefetcher's pin on the photo is released; callers that need the file to stay pin it themselves.
+
+        :param url: The URL of the photo.
+        :return: The absolute path of the cached photo.
+        :raises: The download's exception if the prefetch failed.
+        """
+        future = self.futures.pop(url, None)
+        if future is None:
+            return self.driver.photo_cache.get(url)
+        try:
+            if future.cancelled():
+                return self.driver.photo_cache.get(url)
+            return future.result()
+        finally:
+            self.driver.photo_cache.unpin([url])
@@ -0,0 +1,76 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+# Marks the end of the input on a stage queue
+_DONE = object()
+
+
+class Pipeline:
+    def __init__(self, stages: List[Tuple[str, Callable[[Any], Any], int]], queue_size: int = 2,
+                 on_error: Optional[Callable[[str, Any, Exception], None]] = None) -> None:
+        """
+        Initialize a pipeline of concurrent stages connected by bounded queues.
+
+        Each stage runs in its own worker threads and hands its result to the next stage. A stage returning
+        None drops the item. Because every queue is bounded, a slow stage blocks the stages feeding it instead
+        of letting work pile up in memory.
+
+        :param stages: A list of (name, function, worker count) tuples, in processing order.
+        :param queue_size: The maximum number of items waiting in front of each stage.
+        :param on_error: Optional callback(stage name, item, exception) for items a stage failed on.
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self.on_error = on_error
+        self.workers = [max(1, workers) for _, _, workers in stages]
+        self._remaining = list(self.workers)
+        self._lock = threading.Lock()
+
+    def _worker(self, index: int) -> None:
+        name, function, _ = self.stages[index]
+        inbox = self.queues[index]
+        outbox = self.queues[index + 1] if index + 1 < len(self.queues) else None
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            try:
+                result = function(item)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(name, item, e)
+                continue
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+        # The last worker of a stage to finish tells every worker of the next stage to stop
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last and outbox is not None:
+            for _ in range(self.workers[index + 1]):
+                outbox.put(_DONE)
+
+    def run(self, items: Iterable[Any]) -> None:
+        """
+        Feeds items through every stage and returns once all of them have left the last stage.
+
+        :param items: The items to process.
+        """
+        self._remaining = list(self.workers)
+        threads = []
+        for index, (name, _, _) in enumerate(self.stages):
+            for number in range(self.workers[index]):
+                thread = threading.Thread(target=self._worker, args=(index,), name=f"{name}-{number}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            self.queues[0].put(item)
+        for _ in range(self.workers[0]):
+            self.queues[0].put(_DONE)
+
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,150 @@
+import os
+import io
+import time
+import pstats
+import signal
+import cProfile
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+# Number of iterations to profile, read once when the driver starts
+ENV_VARIABLE = 'FMAP_PROFILE_ITERATIONS'
+
+# Blocking lock acquisitions, which every wait on another thread ends in: Future.result, as_completed,
+# Queue.get, Thread.join and the waits of the pipeline and prefetcher
+LOCK_ACQUIRES = ("<method 'acquire' of '_thread.lock' objects>", "<method 'acquire' of '_thread.RLock' objects>")
+
+
+class IterationProfiler:
+    def __init__(self, driver, output_dir: str = "data/profiles", top: int = 30, signal_iterations: int = 1) -> None:
+        """
+        Initialize an on-demand cProfile hook for Driver.run_iter.
+
+        Profiling is requested by setting FMAP_PROFILE_ITERATIONS to a number of iterations before starting the
+        driver, or by sending SIGUSR1 to the process, which profiles the next signal_iterations iterations.
+        Each profiled iteration writes a .prof dump, loadable with pstats or snakeviz, and a .txt summary with
+        the wall time split between Python, WebDriver commands, backend HTTP calls, sleeps and waits on worker
+        threads, followed by the top functions. Only the thread running run_iter is profiled, so the work of
+        the thread and process pools shows up as waiting. When nothing is requested, an iteration
+        costs one comparison.
+
+        :param driver: An instance of the Driver class, used for logging.
+        :param output_dir: The directory the dumps and summaries are written to.
+        :param top: Number of functions listed in each summary.
+        :param signal_iterations: Number of iterations profiled per SIGUSR1.
+        """
+        self.driver = driver
+        self.output_dir = output_dir
+        self.top = top
+        self.signal_iterations = signal_iterations
+        self.remaining = int(os.environ.get(ENV_VARIABLE) or 0)
+        self._lock = threading.Lock()
+        # Signal handlers can only be installed from the main thread, and SIGUSR1 doesn't exist on Windows
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, signum, frame) -> None:
+        self.request(self.signal_iterations)
+
+    def request(self, iterations: int = 1) -> None:
+        """
+        Profiles the next iterations.
+
+        :param iterations: Number of iterations to profile.
+        """
+        with self._lock:
+            self.remaining += iterations
+
+    def run(self, function: Callable[[], Any]) -> Any:
+        """
+        Calls function, under the profiler if an iteration was requested.
+
+        :param function: The iteration, usually Driver.run_iter.
+        :return: The result of the function.
+        """
+        if self.remaining <= 0:
+            return function()
+        with self._lock:
+            self.remaining -= 1
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            return profile.runcall(function)
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            try:
+                self.write(profile, wall, cpu)
+            except Exception as e:
+                self.driver.record_log('error', f"Failed to write the profile: {e}")
+
+    @staticmethod
+    def breakdown(stats: pstats.Stats, wall: float) -> Dict[str, float]:
+        """
+        Splits an iteration's wall time between Python and the calls it blocked on.
+
+        WebDriver is the cumulative time of WebDriver.execute, HTTP that of requests' Session.request, sleep
+        the time.sleep calls made outside those two, such as the random human-like delays, and waiting the
+        time blocked on locks, which is how the iteration waits for its thread and process pools.
+
+        :param stats: The statistics of the profiled iteration.
+        :param wall: The wall time of the iteration in seconds.
+        :return: The seconds spent in each category, including the remaining Python time.
+        """
+        webdriver = http = sleep = waiting = 0.0
+        for (filename, _, name), (_, _, _, cumulative, callers) in stats.stats.items():
+            path = filename.replace('\\', '/')
+            if name == 'execute' and path.endswith('selenium/webdriver/remote/webdriver.py'):
+                webdriver += cumulative
+            elif name == 'request' and path.endswith('requests/sessions.py'):
+                http += cumulative
+            elif name == '<built-in method time.sleep>':
+                # Retry backoffs sleep inside the HTTP calls and are already counted there
+                sleep += sum(caller[3] for (caller_file, _, _), caller in callers.items()
+                             if not any(part in caller_file.replace('\\', '/') for part in ('urllib3/', 'requests/', 'selenium/')))
+            elif name in LOCK_ACQUIRES:
+                waiting += cumulative
+        return {
+            'wall': wall,
+            'webdriver': webdriver,
+            'http': http,
+            'sleep': sleep,
+            'waiting': waiting,
+            'python': max(0.0, wall - webdriver - http - sleep - waiting),
+        }
+
+    def write(self, profile: cProfile.Profile, wall: float, cpu: float) -> str:
+        """
+        Writes the dump and the summary of a profiled iteration.
+
+        :param profile: The profile of the iteration.
+        :param wall: The wall time of the iteration in seconds.
+        :param cpu: The CPU time of the process during the iteration in seconds.
+        :return: The path of the dump, without extension.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_path = os.path.join(self.output_dir, f"run_iter-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        profile.dump_stats(f"{base_path}.prof")
+
+        output = io.StringIO()
+        stats = pstats.Stats(profile, stream=output)
+        split = self.breakdown(stats, wall)
+        output.write(f"Wall time: {wall:.3f}s, process CPU time: {cpu:.3f}s\n")
+        for category in ('python', 'webdriver', 'http', 'sleep', 'waiting'):
+            share = split[category] / wall * 100 if wall else 0.0
+            output.write(f"  {category:<10} {split[category]:9.3f}s {share:5.1f}%\n")
+        output.write(f"\nTop {self.top} functions by own time:\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        output.write(f"\nTop {self.top} functions by cumulative time:\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        with open(f"{base_path}.txt", 'w') as file:
+            file.write(output.getvalue())
+
+        self.driver.record_log('info', f"Profiled iteration in {wall:.1f}s (python {split['python']:.1f}s, webdriver "
+                                       f"{split['webdriver']:.1f}s, http {split['http']:.1f}s, sleep {split['sleep']:.1f}s, "
+                                       f"waiting {split['waiting']:.1f}s), "
+                                       f"written to {base_path}.prof")
+        return base_path
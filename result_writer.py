@@ -0,0 +1,111 @@
+import time
+import requests
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ResultWriter:
+    def __init__(self, driver, batch_size: int = 50, flush_interval: float = 30.0, retries: int = 3) -> None:
+        """
+        Initialize a buffered writer for the listing statistics of each account.
+
+        Records are keyed by account and listing, the listing being identified by a caller-given key (its title
+        by default, which several listings may share). They are sent in batches once batch_size of them are
+        pending or flush_interval seconds have passed since the last flush, and whenever flush is called.
+        A record whose values were already sent is skipped, and records of a failed batch stay pending
+        until a later flush succeeds.
+
+        :param driver: An instance of the Driver class, used for logging and HTTP requests.
+        :param batch_size: Number of pending records that triggers a flush.
+        :param flush_interval: Seconds after which pending records are flushed on the next add.
+        :param retries: Number of retries of a failed batch within one flush.
+        """
+        self.driver = driver
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.pending: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        # Values last accepted by the backend, keyed by (account ID, listing key)
+        self.sent: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+        self.last_flush = time.monotonic()
+        # Cleared the first time the backend rejects a batch
+        self.batch_supported = True
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self.pending.values())
+
+    def add(self, account_id: Any, record: Dict[str, Any], key: Optional[Any] = None) -> None:
+        """
+        Queues the statistics of one listing, flushing when the batch is full or the interval has passed.
+
+        :param account_id: The ID of the account the listing belongs to.
+        :param record: The listing statistics, with at least a "title" key.
+        :param key: Optional hashable identity of the listing within the account, such as its position and
+            title; a later record with the same key replaces this one. Defaults to the title.
+        """
+        key = record['title'] if key is None else key
+        if self.sent.get((account_id, key)) == record:
+            self.pending.get(account_id, {}).pop(key, None)
+            return
+        self.pending.setdefault(account_id, {})[key] = dict(record)
+        if len(self) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def _post(self, account_id: Any, records: List[Dict[str, Any]]) -> None:
+        path = f"accounts/{account_id}/update"
+        if self.batch_supported and len(records) > 1:
+            try:
+                self.driver.send_http_request('POST', path, {'listings': records})
+                return
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is None or not 400 <= status < 500:
+                    raise
+                self.driver.record_log('info', f"Backend rejected the batch update ({status}), sending listings one by one.")
+                self.batch_supported = False
+
+        for index, record in enumerate(records):
+            try:
+                self.driver.send_http_request('POST', path, record)
+            except Exception:
+                # Keep only the records that weren't sent for the retry
+                del records[:index]
+                raise
+
+    def flush(self, account_id: Optional[Any] = None) -> bool:
+        """
+        Sends the pending records, retrying each failed batch with exponential backoff.
+
+        :param account_id: Optional account to flush; all accounts are flushed by default.
+        :return: True if nothing is left pending for the flushed accounts.
+        """
+        self.last_flush = time.monotonic()
+        accounts = [account_id] if account_id is not None else list(self.pending)
+        success = True
+        for account in accounts:
+            items = list(self.pending.get(account, {}).items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                remaining = [record for _, record in batch]
+                for attempt in range(self.retries + 1):
+                    try:
+                        self._post(account, remaining)
+                        remaining = []
+                        break
+                    except Exception as e:
+                        self.driver.record_log('error', f"Failed to update {len(remaining)} listings of account {account} (attempt {attempt + 1}): {e}")
+                        if attempt < self.retries:
+                            time.sleep(2 ** attempt)
+                # _post trims the records it sent off the front of remaining
+                unsent = {id(record) for record in remaining}
+                for key, record in batch:
+                    if id(record) in unsent:
+                        continue
+                    self.sent[(account, key)] = record
+                    del self.pending[account][key]
+                if remaining:
+                    success = False
+                else:
+                    self.driver.record_log('info', f"Updated {len(batch)} listings of account {account}.")
+            if not self.pending.get(account):
+                self.pending.pop(account, None)
+        return success
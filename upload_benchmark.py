@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import argparse
+import tempfile
+import logging
+from typing import Any, Dict, List
+from driver import Driver
+from mock_backend import MockBackend
+from video_frame_extractor import VideoFrameExtractor
+
+
+def write_frames(frames_dir: str, count: int, size: int) -> None:
+    """
+    Writes placeholder frames; the mock backend only counts the bytes it receives, so they needn't be images.
+
+    :param frames_dir: The directory the frames are written to.
+    :param count: The number of frames.
+    :param size: The size of each frame in bytes.
+    """
+    os.makedirs(frames_dir, exist_ok=True)
+    for number in range(count):
+        with open(os.path.join(frames_dir, "{:0>4d}.jpg".format(number)), 'wb') as file:
+            file.write(os.urandom(size))
+
+
+def run(batch_uploads: bool, frames: int, frame_size: int, batch_size: int, workers: int) -> Dict[str, Any]:
+    """
+    Uploads one directory of frames with upload_frames against a mock backend that accepts or rejects batches.
+
+    :param batch_uploads: Whether the mock backend accepts `photos[]` batch uploads.
+    :param frames: The number of frames uploaded.
+    :param frame_size: The size of each frame in bytes.
+    :param batch_size: The upload_batch_size of the extractor.
+    :param workers: The upload_workers of the extractor.
+    :return: The upload summary, the requests the backend received and the photos it stored.
+    """
+    photos_group_id = 'upload-benchmark'
+    with MockBackend(batch_uploads=batch_uploads) as backend:
+        driver = Driver(backend.url, ship_logs=False)
+        extractor = VideoFrameExtractor(driver, handle=False, hash_store_path=None, upload_batch_size=batch_size,
+                                        upload_batch_bytes=batch_size * frame_size, upload_workers=workers)
+        frames_dir = tempfile.mkdtemp(prefix='fmap-frames-')
+        write_frames(frames_dir, frames, frame_size)
+        try:
+            summary = extractor.upload_frames(frames_dir, photos_group_id)
+        finally:
+            shutil.rmtree(frames_dir, ignore_errors=True)
+        stored = backend.photos.get(photos_group_id, {})
+        return {
+            'batch_uploads_accepted': batch_uploads,
+            'batch_upload_supported_after': extractor.batch_upload_supported,
+            'uploaded': summary['uploaded'],
+            'failed': summary['failed'],
+            'seconds': summary['seconds'],
+            'requests': backend.requests.get('photos/{id}/add', 0),
+            'accepted_requests': stored.get('requests', 0),
+            'photos': stored.get('photos', 0),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Upload frames in batches to a local server that accepts or rejects them.")
+    parser.add_argument('--frames', type=int, default=40, help="Number of frames uploaded.")
+    parser.add_argument('--frame-size', type=float, default=100.0, help="Size of each frame in kilobytes.")
+    parser.add_argument('--batch-size', type=int, default=8, help="Maximum frames per batch request.")
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent upload requests.")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    frame_size = int(args.frame_size * 1000)
+    results: List[Dict[str, Any]] = [run(accepted, args.frames, frame_size, args.batch_size, args.workers)
+                                     for accepted in (True, False)]
+    for result in results:
+        if result['photos'] != args.frames or result['failed']:
+            raise RuntimeError(f"Backend stored {result['photos']} of {args.frames} frames: {result}")
+
+    output = json.dumps({'frames': args.frames, 'frame_size': frame_size, 'batch_size': args.batch_size,
+                         'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,131 +1,716 @@
 import os
+import time
 import uuid
+import errno
+import select
+import hashlib
+import threading
 import requests
 import cv2
-from PIL import Image
-import imagehash
 import shutil
-from typing import Dict, Any, List
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
+from downloader import StreamDownloader, DownloadError
+from hash_index import HashIndex
+from frame_hashing import hash_frames, ALGORITHMS
+from frame_hash_store import FrameHashStore
+from pipeline import Pipeline
+from frame_encoder import FrameEncoder, FORMATS
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: downloads of one URL are only serialized within this process
+    fcntl = None
+
+# Locks of the URLs being downloaded, with their number of users, used when fcntl is not available
+_url_locks: Dict[str, Tuple[threading.Lock, int]] = {}
+_url_locks_guard = threading.Lock()
+
+# The extractor of a worker process, built once by init_worker and reused by every job of that worker
+_worker_extractor: Optional['VideoFrameExtractor'] = None
+
+
+def init_worker(driver_class, base_url: str, driver_options: Dict[str, Any], options: Dict[str, Any]) -> None:
+    """
+    Builds the driver and extractor of a worker process, once, when the process starts.
+
+    The worker builds its own, since the parent's WebDriver and sessions can't be pickled. Its driver gets
+    the parent's options, except the metrics endpoints, which belong to the parent.
+
+    :param driver_class: The class of the parent's driver.
+    :param base_url: Base URL of the API.
+    :param driver_options: The options of the parent's driver.
+    :param options: The options of the parent's VideoFrameExtractor.
+    """
+    global _worker_extractor
+    driver_options = {name: value for name, value in driver_options.items()
+                      if name not in ('metrics_port', 'metrics_textfile')}
+    options = {**options, 'process_workers': 0, 'pipelined': False}
+    _worker_extractor = VideoFrameExtractor(driver_class(base_url, **driver_options), handle=False, **options)
+
+def process_video(video: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Downloads, extracts and uploads the frames of one video inside a worker process.
+
+    The worker's log entries are flushed at the end of every job, since pool workers exit without running
+    atexit handlers.
+
+    :param video: A dictionary containing video details.
+    :return: The video, once its frames are uploaded.
+    """
+    extractor = _worker_extractor
+    try:
+        frames_dir = extractor.ingest_video(video)
+        extractor.upload_frames(frames_dir, video['photos_group_id'])
+        return video
+    finally:
+        if extractor.driver.log_shipper is not None:
+            extractor.driver.log_shipper.flush()
 
 class VideoFrameExtractor:
-    def __init__(self, driver) -> None:
+    # Default number of worker threads per stage of the pipelined mode
+    STAGE_WORKERS = {'download': 2, 'extract': 1, 'upload': 2, 'done': 1}
+
+    def __init__(self, driver, chunk_size: int = 1024 * 1024, max_video_size: Optional[int] = None,
+                 download_segments: int = 1, min_segment_size: int = 8 * 1024 * 1024,
+                 frame_step: int = 1, target_fps: Optional[float] = None, keyframes_only: bool = False,
+                 hash_threshold: int = 5, hash_algorithm: str = 'ahash', hash_batch_size: int = 8,
+                 hash_store_path: Optional[str] = "data/frame_hashes.sqlite3", query_backend_hashes: bool = False,
+                 pipelined: bool = False, stage_workers: Optional[Dict[str, int]] = None, queue_size: int = 2,
+                 output_format: str = 'jpg', output_quality: int = 95, max_long_edge: Optional[int] = None,
+                 progressive_jpeg: bool = False, optimize_jpeg: bool = False, encode_workers: int = 2,
+                 report_savings: bool = False, process_workers: int = 0, upload_workers: int = 4,
+                 upload_retries: int = 2, upload_batch_size: int = 1, upload_batch_bytes: int = 4 * 1024 * 1024,
+                 streaming_decode: bool = False, handle: bool = True) -> None:
         """
         Initialize the VideoFrameExtractor with a Driver instance.
 
         :param driver: An instance of the Driver class.
+        :param chunk_size: Number of bytes written to disk at a time while downloading a video.
+        :param max_video_size: Optional maximum video size in bytes; larger videos are not downloaded.
+        :param download_segments: Number of parallel connections used per video; 1 disables segmented downloads.
+        :param min_segment_size: Minimum number of bytes fetched by each connection of a segmented download.
+        :param frame_step: Keep every Nth frame of the video (1 keeps every frame).
+        :param target_fps: Optional number of frames to keep per second of video; overrides frame_step.
+        :param keyframes_only: Keep only the keyframes of the video; overrides frame_step and target_fps.
+        :param hash_threshold: Maximum hash distance at which two frames are considered duplicates.
+        :param hash_algorithm: Perceptual hash used to compare frames: 'ahash', 'dhash' or 'phash'.
+        :param hash_batch_size: Number of decoded frames hashed together.
+        :param hash_store_path: SQLite file remembering the frames already uploaded per photo group; None disables it.
+        :param query_backend_hashes: Whether to ask the backend for the hashes a photo group already has.
+        :param pipelined: Whether to run the download, extract, upload and mark-done stages concurrently.
+        :param stage_workers: Optional worker count per pipeline stage, keyed by stage name (see STAGE_WORKERS).
+        :param queue_size: Maximum number of videos waiting in front of each pipeline stage.
+        :param output_format: Format the frames are written in, 'jpg' or 'webp'.
+        :param output_quality: JPEG or WebP quality of the written frames, from 0 to 100.
+        :param max_long_edge: Optional maximum length in pixels of the longer side of the written frames.
+        :param progressive_jpeg: Whether to write progressive JPEGs.
+        :param optimize_jpeg: Whether to optimize the JPEG Huffman tables.
+        :param encode_workers: Number of threads encoding frames while the video is decoded.
+        :param report_savings: Whether to measure the bytes saved against OpenCV's default JPEG settings.
+        :param process_workers: Number of processes handling videos in parallel; 0 handles them in this process.
+        :param upload_workers: Number of frames uploaded concurrently.
+        :param upload_retries: Number of times a failed frame upload is retried.
+        :param upload_batch_size: Maximum number of frames sent in one multipart request; 1 sends them one by one.
+        :param upload_batch_bytes: Maximum number of frame bytes sent in one multipart request.
+        :param streaming_decode: Whether to start decoding streamable videos while they are still downloading.
+        :param handle: Whether to fetch and handle the pending videos right away.
+        :raises ValueError: If the hash algorithm or output format is not supported.
         """
+        # Keep the options so worker processes can build an identical extractor
+        options = dict(locals())
+        self.options = {name: value for name, value in options.items() if name not in ('self', 'driver', 'handle')}
+        if hash_algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported hash algorithm: {hash_algorithm}")
+        if output_format not in FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
         self.driver = driver
-        self.handle_videos()
+        self.frame_step = max(1, frame_step)
+        self.target_fps = target_fps
+        self.keyframes_only = keyframes_only
+        self.hash_threshold = hash_threshold
+        self.hash_algorithm = hash_algorithm
+        self.hash_batch_size = max(1, hash_batch_size)
+        self.hash_store = FrameHashStore(hash_store_path) if hash_store_path else None
+        self.query_backend_hashes = query_backend_hashes
+        # Hash of every frame written to disk, keyed by its absolute path, so uploads can be recorded
+        self.frame_hashes: Dict[str, int] = {}
+        self.download_segments = download_segments
+        self.min_segment_size = min_segment_size
+        self.pipelined = pipelined
+        self.stage_workers = {**self.STAGE_WORKERS, **(stage_workers or {})}
+        self.queue_size = queue_size
+        self.process_workers = process_workers
+        self.streaming_decode = streaming_decode
+        self.upload_workers = max(1, upload_workers)
+        self.upload_retries = upload_retries
+        self.upload_batch_size = max(1, upload_batch_size)
+        self.upload_batch_bytes = upload_batch_bytes
+        # Cleared the first time the backend rejects a batch upload
+        self.batch_upload_supported = True
+        # One keep-alive connection per upload thread in the driver's pool, shared by every frame of every video
+        self.driver.session.resize(self.upload_workers * (self.stage_workers['upload'] if pipelined else 1))
+        self.encoding_options = {
+            'output_format': output_format,
+            'quality': output_quality,
+            'max_long_edge': max_long_edge,
+            'progressive': progressive_jpeg,
+            'optimize': optimize_jpeg,
+            'workers': encode_workers,
+            'report_savings': report_savings,
+        }
+        # Encoding report of every extracted video, keyed by its frames directory
+        self.encoding_reports: Dict[str, Dict[str, Any]] = {}
+        self.downloader = StreamDownloader(driver, chunk_size=chunk_size, max_size=max_video_size,
+                                           session=driver.session)
+        if handle:
+            self.handle_videos()
+
+    def video_download_path(self, video_url: str) -> str:
+        """
+        Returns the path a video's partial download is kept under, without the .part suffix.
+
+        The path is named after the URL so an interrupted download can be resumed on the next run.
+
+        :param video_url: The URL of the video.
+        :return: The local path.
+        """
+        download_folder = "download/videos"
+        os.makedirs(download_folder, exist_ok=True)
+        video_extension = os.path.splitext(video_url)[-1]
+        unique_filename = f"{hashlib.sha1(video_url.encode()).hexdigest()}{video_extension}"
+        return os.path.join(download_folder, unique_filename)
+
+    def job_download_path(self, video_url: str) -> str:
+        """
+        Returns the path one job downloads a video to; its frames directory is derived from it.
+
+        Every job gets its own file, so jobs sharing a URL never decode, rename or delete each other's files.
+
+        :param video_url: The URL of the video.
+        :return: The local path.
+        """
+        base, extension = os.path.splitext(self.video_download_path(video_url))
+        return f"{base}-{uuid.uuid4().hex[:12]}{extension}"
+
+    @contextmanager
+    def url_lock(self, video_url: str):
+        """
+        Serializes the downloads of one URL across threads and processes, since they share its partial file.
+
+        The lock file is removed by its holder before it is released. A job that was waiting on the removed
+        file finds it gone once it gets the lock, and locks a new one instead.
+
+        :param video_url: The URL of the video.
+        """
+        lock_path = f"{self.video_download_path(video_url)}.lock"
+        if fcntl is None:
+            with _url_locks_guard:
+                lock, users = _url_locks.get(lock_path, (threading.Lock(), 0))
+                _url_locks[lock_path] = (lock, users + 1)
+            try:
+                with lock:
+                    yield
+            finally:
+                with _url_locks_guard:
+                    lock, users = _url_locks[lock_path]
+                    if users > 1:
+                        _url_locks[lock_path] = (lock, users - 1)
+                    else:
+                        del _url_locks[lock_path]
+            return
+        while True:
+            lock_file = open(lock_path, 'a')
+            # Every open file gets its own flock, so this also excludes other threads of this process
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                    break
+            except FileNotFoundError:
+                pass
+            # The previous holder removed the file while this job waited on it
+            lock_file.close()
+        try:
+            yield
+        finally:
+            os.remove(lock_path)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
 
     def download_video(self, video: Dict[str, Any]) -> str:
         """
         Downloads a video from a given URL and saves it locally.
 
         :param video: A dictionary containing video details, including the video URL.
-        :return: The local path to the downloaded video.
+        :return: The local path to the downloaded video, unique to this job.
         :raises: requests.exceptions.RequestException if the download fails.
+        :raises: DownloadError if the video is too large or fails its checksum.
         """
-        download_folder = "download/videos"
-        os.makedirs(download_folder, exist_ok=True)
-
         video_url = video["video"]
-        video_extension = os.path.splitext(video_url)[-1]
-        unique_filename = f"{uuid.uuid4()}{video_extension}"
-        download_path = os.path.join(download_folder, unique_filename)
+        download_path = self.job_download_path(video_url)
+        part_path = f"{self.video_download_path(video_url)}.part"
         self.driver.record_log('info', f"Starting the download from: {video_url}")
         
         try:
-            response = requests.get(video_url)
-            response.raise_for_status()
-            with open(download_path, 'wb') as file:
-                file.write(response.content)
-            self.driver.record_log('info', f"Video saved successfully to {download_path}")
+            with self.url_lock(video_url):
+                if self.download_segments > 1:
+                    result = self.downloader.download_segmented(video_url, download_path, self.download_segments,
+                                                                self.min_segment_size, video.get("checksum"), part_path)
+                else:
+                    result = self.downloader.download(video_url, download_path, video.get("checksum"),
+                                                      part_path=part_path)
+            self.driver.record_log('info', f"Video saved successfully to {download_path} ({result['size']} bytes, sha256 {result['checksum']})")
             return download_path
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, DownloadError) as e:
             self.driver.record_log('error', f"Failed to download video from {video_url}: {e}")
             raise
 
-    def remove_similar_frames(self, frames_dir: str) -> None:
+    def save_new_frames(self, frames: List[Any], kept_hashes: HashIndex, frames_dir: str, frame_count: int,
+                        encoder: FrameEncoder) -> int:
         """
-        Removes similar frames from a directory by comparing their hashes.
+        Hashes a batch of decoded frames in memory and writes only those that aren't near-duplicates.
 
-        :param frames_dir: The directory containing the video frames.
+        :param frames: The BGR frames returned by OpenCV, in video order.
+        :param kept_hashes: The index of the frames kept so far; new frames are added to it.
+        :param frames_dir: The directory the frames are written to.
+        :param frame_count: The number of frames written so far, used to name the files.
+        :param encoder: The encoder the new frames are handed to.
+        :return: The updated number of frames written.
         """
-        image_hashes = {}
-        path = os.path.abspath(frames_dir)
-        for filename in os.listdir(path):
-            file_path = os.path.join(path, filename)
-            if os.path.isfile(file_path):
-                with Image.open(file_path) as img:
-                    img_hash = imagehash.average_hash(img)
-                for existing_hash, existing_filename in image_hashes.items():
-                    similarity_distance = img_hash - existing_hash
-                    if similarity_distance <= 5:
-                        os.remove(file_path)
-                        break
-                else:
-                    image_hashes[img_hash] = filename
-    
-    def upload_frames(self, frames_dir: str, photos_group_id: str) -> None:
+        if not frames:
+            return frame_count
+        for frame, img_hash in zip(frames, hash_frames(frames, self.hash_algorithm)):
+            img_hash = int(img_hash)
+            if kept_hashes.any_within(img_hash):
+                continue
+            kept_hashes.add(img_hash)
+            frame_path = os.path.abspath(os.path.join(frames_dir, "{:0>4d}".format(frame_count)+encoder.extension))
+            encoder.submit(frame, frame_path)
+            self.frame_hashes[frame_path] = img_hash
+            frame_count += 1
+        return frame_count
+
+    def upload_frame(self, file_path: str, photos_group_id: str) -> Tuple[bool, int]:
+        """
+        Uploads a single frame, retrying with exponential backoff.
+
+        :param file_path: The path of the frame.
+        :param photos_group_id: The ID of the photo group to which the frame should be uploaded.
+        :return: Whether the frame was uploaded and its size in bytes.
+        """
+        filename = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        for attempt in range(self.upload_retries + 1):
+            self.driver.record_log('info', f'Starting upload of {filename}')
+            try:
+                with open(file_path, 'rb') as photo:
+                    photos = {'photo': (filename, photo)}
+                    self.driver.send_http_request('POST', f"photos/{photos_group_id}/add", photos, files=True)
+                self.driver.record_log('info', f'Successfully uploaded {filename}')
+                self.record_uploaded(photos_group_id, file_path)
+                return True, size
+            except Exception as e:
+                self.driver.record_log('error', f'Failed to upload {filename} (attempt {attempt + 1}): {e}')
+                if attempt < self.upload_retries:
+                    time.sleep(2 ** attempt)
+        return False, size
+
+    def batch_frames(self, file_paths: List[str]) -> List[List[str]]:
+        """
+        Groups frames into batches of at most upload_batch_size frames and upload_batch_bytes bytes.
+
+        :param file_paths: The paths of the frames.
+        :return: The batches; a frame larger than upload_batch_bytes gets a batch of its own.
+        """
+        batches = []
+        batch, batch_bytes = [], 0
+        for file_path in file_paths:
+            size = os.path.getsize(file_path)
+            if batch and (len(batch) >= self.upload_batch_size or batch_bytes + size > self.upload_batch_bytes):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(file_path)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def upload_batch(self, file_paths: List[str], photos_group_id: str) -> List[Tuple[bool, int]]:
+        """
+        Uploads several frames in one multipart request, as repeated `photos[]` fields.
+
+        If the backend rejects the batch form with a 4xx response, batch uploads are disabled for the rest of
+        the run and the frames are uploaded one by one.
+
+        :param file_paths: The paths of the frames.
+        :param photos_group_id: The ID of the photo group to which the frames should be uploaded.
+        :return: Whether each frame was uploaded, and its size in bytes.
         """
-        Uploads frames to a remote server and deletes the local frames directory after uploading.
+        if len(file_paths) == 1 or not self.batch_upload_supported:
+            return [self.upload_frame(file_path, photos_group_id) for file_path in file_paths]
+
+        sizes = [os.path.getsize(file_path) for file_path in file_paths]
+        for attempt in range(self.upload_retries + 1):
+            self.driver.record_log('info', f'Starting batch upload of {len(file_paths)} frames')
+            handles = []
+            try:
+                for file_path in file_paths:
+                    handles.append(open(file_path, 'rb'))
+                photos = [('photos[]', (os.path.basename(file_path), handle)) for file_path, handle in zip(file_paths, handles)]
+                self.driver.send_http_request('POST', f"photos/{photos_group_id}/add", photos, files=True)
+                self.driver.record_log('info', f'Successfully uploaded a batch of {len(file_paths)} frames')
+                for file_path in file_paths:
+                    self.record_uploaded(photos_group_id, file_path)
+                return [(True, size) for size in sizes]
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and 400 <= status < 500:
+                    self.driver.record_log('info', f"Backend rejected the batch upload ({status}), uploading frames one by one.")
+                    self.batch_upload_supported = False
+                    break
+                self.driver.record_log('error', f'Failed to upload a batch of {len(file_paths)} frames (attempt {attempt + 1}): {e}')
+            except Exception as e:
+                self.driver.record_log('error', f'Failed to upload a batch of {len(file_paths)} frames (attempt {attempt + 1}): {e}')
+            finally:
+                for handle in handles:
+                    handle.close()
+            if attempt < self.upload_retries:
+                time.sleep(2 ** attempt)
+        else:
+            return [(False, size) for size in sizes]
+        return [self.upload_frame(file_path, photos_group_id) for file_path in file_paths]
+
+    def upload_frames(self, frames_dir: str, photos_group_id: str) -> Dict[str, Any]:
+        """
+        Uploads frames to a remote server concurrently and deletes the local frames directory once every
+        frame has been handled.
 
         :param frames_dir: The directory containing the video frames.
         :param photos_group_id: The ID of the photo group to which frames should be uploaded.
+        :return: A summary with the number of frames uploaded and failed, the bytes uploaded and the time taken.
         """
+        start = time.monotonic()
         path = os.path.abspath(frames_dir)
-        for filename in os.listdir(path):
-            file_path = os.path.join(path, filename)
-            if os.path.isfile(file_path):
-                self.driver.record_log('info', f'Starting upload of {filename}')
-                with open(file_path, 'rb') as photo:
-                    photos = {'photo': (filename, photo)}
-                    try:
-                        self.driver.send_http_request('POST', f"photos/{photos_group_id}/add", photos, files=True)
-                        self.driver.record_log('info', f'Successfully uploaded {filename}')
-                    except:
-                        self.driver.record_log('error', f'Failed to upload {filename}.')
+        file_paths = [os.path.join(path, filename) for filename in sorted(os.listdir(path))]
+        file_paths = [file_path for file_path in file_paths if os.path.isfile(file_path)]
+
+        if self.upload_batch_size > 1 and self.batch_upload_supported:
+            batches = self.batch_frames(file_paths)
+        else:
+            batches = [[file_path] for file_path in file_paths]
+
+        summary = {'uploaded': 0, 'failed': 0, 'bytes': 0, 'batches': len(batches)}
+        with ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix='upload') as executor:
+            futures = [executor.submit(self.upload_batch, batch, photos_group_id) for batch in batches]
+            for future in as_completed(futures):
+                for uploaded, size in future.result():
+                    if uploaded:
+                        summary['uploaded'] += 1
+                        summary['bytes'] += size
+                    else:
+                        summary['failed'] += 1
+        summary['seconds'] = round(time.monotonic() - start, 3)
 
         shutil.rmtree(frames_dir)
+        self.driver.record_log('info', f"Uploaded {summary['uploaded']} frames ({summary['bytes']} bytes) to photo group {photos_group_id} in {summary['seconds']}s, {summary['failed']} failed.")
+        return summary
+
+    def record_uploaded(self, photos_group_id: str, file_path: str) -> None:
+        """
+        Remembers the hash of an uploaded frame so later videos of the same photo group skip it.
+
+        :param photos_group_id: The ID of the photo group the frame was uploaded to.
+        :param file_path: The path of the uploaded frame.
+        """
+        img_hash = self.frame_hashes.pop(os.path.abspath(file_path), None)
+        if self.hash_store is not None and img_hash is not None:
+            self.hash_store.add(photos_group_id, self.hash_algorithm, [img_hash])
+
+    def known_hashes(self, photos_group_id: Optional[str]) -> HashIndex:
+        """
+        Builds an index of the frames a photo group already has, from the local store and optionally the backend.
+
+        :param photos_group_id: The ID of the photo group, or None for an empty index.
+        :return: The index, with max_distance set to hash_threshold.
+        """
+        index = HashIndex(max_distance=self.hash_threshold)
+        if photos_group_id is None:
+            return index
+
+        if self.hash_store is not None:
+            for img_hash in self.hash_store.hashes(photos_group_id, self.hash_algorithm):
+                index.add(img_hash)
+
+        if self.query_backend_hashes:
+            try:
+                remote_hashes = self.driver.send_http_request('GET', f"photos/{photos_group_id}/hashes")
+                for img_hash in remote_hashes or []:
+                    index.add(int(img_hash, 16))
+            except Exception as e:
+                self.driver.record_log('error', f"Failed to fetch the hashes of photo group {photos_group_id}: {e}")
+
+        if len(index):
+            self.driver.record_log('info', f"Photo group {photos_group_id} already has {len(index)} frames.")
+        return index
     
     def mark_video_as_done(self, video):
         """
-        Marks a video as published on the server.
+        Marks a video as published on the server, in the background so the next video isn't held up.
 
         :param video: A dictionary containing video details, including the video ID.
+        :return: A future resolving to the server's response.
         """
         self.driver.record_log('info', f'Marking the video {video["id"]} as done')
         data = {"state": "published"}
-        try:
-            self.driver.record_log('info', f'Video {video["id"]} marked as done')
-            self.driver.send_http_request('POST', f"videos/{video['id']}/published", data)
-        except:
-            self.driver.record_log('error', f"Failed to mark {video['id']} as done.")
+        return self.driver.send_http_request_async('POST', f"videos/{video['id']}/published", data,
+                                                   success_log=f'Video {video["id"]} marked as done',
+                                                   error_log=f"Failed to mark {video['id']} as done")
         
-    def extract_frames(self, video_path: str) -> str:
+    def frame_interval(self, video_file) -> float:
+        """
+        Returns the number of source frames between two kept frames for the configured sampling mode.
+
+        :param video_file: The opened cv2.VideoCapture.
+        :return: The sampling interval in frames.
+        """
+        if self.target_fps:
+            source_fps = video_file.get(cv2.CAP_PROP_FPS)
+            if source_fps and source_fps > 0:
+                return max(1.0, source_fps / self.target_fps)
+            self.driver.record_log('info', "Unknown frame rate, falling back to frame_step sampling.")
+        return float(self.frame_step)
+
+    @staticmethod
+    def is_streamable(head: bytes) -> bool:
+        """
+        Checks from the first bytes of a video whether it can be decoded before it is fully downloaded.
+
+        Matroska/WebM, AVI and MPEG-TS can be read front to back. MP4/MOV can only be decoded from a pipe when
+        the index (`moov` box) comes before the media data (`mdat` box). Other formats are not streamed.
+
+        :param head: The first bytes of the video.
+        :return: True if the video can be decoded progressively, False otherwise.
+        """
+        if head[:4] == b'\x1a\x45\xdf\xa3' or (head[:4] == b'RIFF' and head[8:12] == b'AVI '):
+            return True
+        if head[:1] == b'\x47' and head[188:189] == b'\x47':
+            return True
+        if head[4:8] != b'ftyp':
+            return False
+
+        offset = 0
+        while offset + 8 <= len(head):
+            size = int.from_bytes(head[offset:offset + 4], 'big')
+            box = head[offset + 4:offset + 8]
+            if box == b'moov':
+                return True
+            if box == b'mdat':
+                return False
+            if size == 1 and offset + 16 <= len(head):
+                size = int.from_bytes(head[offset + 8:offset + 16], 'big')
+            if size < 8:
+                break
+            offset += size
+        return False
+
+    def feed_pipe(self, fifo_path: str, video: Dict[str, Any], download_path: str,
+                  stop: threading.Event, result: Dict[str, Any]) -> None:
+        """
+        Downloads a video to disk while copying every byte into a named pipe read by the decoder.
+
+        Once the decoder stops reading (stop is set or the pipe breaks) the download carries on to disk only.
+
+        :param fifo_path: The path of the named pipe.
+        :param video: A dictionary containing video details, including the video URL.
+        :param download_path: The local path where the video should be saved.
+        :param stop: Set by the decoder once it no longer reads the pipe.
+        :param result: Receives the download result under 'download', or the exception under 'error'.
+        """
+        pipe = None
+        while pipe is None and not stop.is_set():
+            try:
+                pipe = os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    break
+                # No reader has opened the pipe yet
+                time.sleep(0.05)
+
+        def on_chunk(chunk: bytes) -> None:
+            nonlocal pipe
+            view = memoryview(chunk)
+            while pipe is not None and view:
+                if stop.is_set():
+                    os.close(pipe)
+                    pipe = None
+                    return
+                if not select.select([], [pipe], [], 0.5)[1]:
+                    continue
+                try:
+                    view = view[os.write(pipe, view):]
+                except BlockingIOError:
+                    continue
+                except BrokenPipeError:
+                    os.close(pipe)
+                    pipe = None
+
+        try:
+            with self.url_lock(video['video']):
+                result['download'] = self.downloader.download(video['video'], download_path, video.get('checksum'), on_chunk,
+                                                              f"{self.video_download_path(video['video'])}.part")
+        except Exception as e:
+            result['error'] = e
+        finally:
+            if pipe is not None:
+                os.close(pipe)
+
+    def stream_video(self, video: Dict[str, Any]) -> Optional[str]:
+        """
+        Decodes a video while it downloads, by feeding the downloaded bytes to OpenCV through a named pipe.
+
+        :param video: A dictionary containing video details, including the video URL.
+        :return: The directory containing the extracted frames, or None when the video can't be streamed and
+            should be downloaded before it is decoded.
+        :raises: requests.exceptions.RequestException or DownloadError if the download fails.
+        """
+        video_url = video['video']
+        if not hasattr(os, 'mkfifo'):
+            self.driver.record_log('info', "Named pipes are not available, downloading the video before decoding it.")
+            return None
+        try:
+            head = self.downloader.fetch_head(video_url)
+        except requests.exceptions.RequestException as e:
+            self.driver.record_log('info', f"Can't read the start of {video_url} ({e}), downloading it before decoding it.")
+            return None
+        if not self.is_streamable(head):
+            self.driver.record_log('info', f"The index of {video_url} is not at its start, downloading it before decoding it.")
+            return None
+
+        download_path = self.job_download_path(video_url)
+        fifo_path = f"{os.path.splitext(download_path)[0]}.fifo"
+        if os.path.exists(fifo_path):
+            os.remove(fifo_path)
+        os.mkfifo(fifo_path)
+
+        self.driver.record_log('info', f"Starting the streaming download from: {video_url}")
+        stop = threading.Event()
+        result = {}
+        feeder = threading.Thread(target=self.feed_pipe, args=(fifo_path, video, download_path, stop, result), daemon=True)
+        feeder.start()
+        try:
+            frames_dir = self.extract_frames(fifo_path, video['photos_group_id'])
+        finally:
+            stop.set()
+            if os.path.exists(fifo_path):
+                os.remove(fifo_path)
+        feeder.join()
+
+        if 'error' in result:
+            self.driver.record_log('error', f"Failed to download video from {video_url}: {result['error']}")
+            if frames_dir:
+                shutil.rmtree(frames_dir)
+            raise result['error']
+        if not frames_dir:
+            # The decoder couldn't read the pipe; decode the complete file instead
+            return self.extract_frames(download_path, video['photos_group_id'])
+
+        os.remove(download_path)
+        report = self.encoding_reports.get(frames_dir, {})
+        self.driver.record_log('info', f"Streamed {video_url}: first frame after {report.get('first_frame_seconds')}s, {report.get('extract_seconds')}s in total.")
+        return frames_dir
+
+    def ingest_video(self, video: Dict[str, Any]) -> str:
+        """
+        Downloads a video and extracts its frames, overlapping both when streaming_decode is enabled.
+
+        :param video: A dictionary containing video details, including the video URL.
+        :return: The directory containing the extracted frames.
+        :raises ValueError: If the video can't be read.
+        """
+        frames_dir = self.stream_video(video) if self.streaming_decode else None
+        if frames_dir is None:
+            video_path = self.download_video(video)
+            frames_dir = self.extract_frames(video_path, video['photos_group_id'])
+        if not frames_dir:
+            raise ValueError("Can't read video.")
+        return frames_dir
+
+    def extract_frames(self, video_path: str, photos_group_id: Optional[str] = None) -> str:
         """
         Extracts frames from a video and saves them to a directory.
 
+        Frames that the sampling mode does not keep are only grabbed, so they are never converted or
+        encoded. When the video backend can't report keyframes, keyframes_only keeps one frame per second.
+        Sampled frames are hashed in memory and near-duplicates of frames already kept, or already uploaded
+        to the photo group, are never written.
+
         :param video_path: The path to the video file.
+        :param photos_group_id: Optional ID of the photo group the frames are meant for.
         :return: The directory containing the extracted frames.
         """
+        start = time.monotonic()
+        first_frame_seconds = None
         video_file = cv2.VideoCapture(video_path)
         if not video_file.isOpened():
             self.driver.record_log('error', "Can't read video.")
             return False
         
         frames_dir = os.path.splitext(video_path)[0]
-        os.makedirs(frames_dir)
+        os.makedirs(frames_dir, exist_ok=True)
         frame_count = 0
-        success = True
-
-        while success:
-            success, frame = video_file.read()
-            if success:
-                frame_path = os.path.abspath(frames_dir+"\\"+str("{:0>4d}".format(frame_count))+".jpg")
-                cv2.imwrite(frame_path, frame)
-                frame_count += 1
-            
+        frame_index = 0
+        sampled = 0
+        batch = []
+        kept_hashes = self.known_hashes(photos_group_id)
+
+        keyframes_only = self.keyframes_only
+        if keyframes_only:
+            interval = max(1.0, video_file.get(cv2.CAP_PROP_FPS) or 1.0)
+        else:
+            interval = self.frame_interval(video_file)
+        next_kept = 0.0
+
+        with FrameEncoder(**self.encoding_options) as encoder:
+            while video_file.grab():
+                if keyframes_only:
+                    is_keyframe = video_file.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)
+                    # The first frame is always a keyframe, so a backend that doesn't flag it doesn't support the property
+                    if is_keyframe < 0 or (frame_index == 0 and is_keyframe == 0):
+                        self.driver.record_log('info', "Keyframes are not reported by the video backend, keeping one frame per second.")
+                        keyframes_only = False
+                    else:
+                        keep = is_keyframe > 0
+                if not keyframes_only:
+                    keep = frame_index >= next_kept
+                    if keep:
+                        next_kept += interval
+                frame_index += 1
+                if not keep:
+                    continue
+
+                success, frame = video_file.retrieve()
+                if success:
+                    if first_frame_seconds is None:
+                        first_frame_seconds = round(time.monotonic() - start, 3)
+                    sampled += 1
+                    batch.append(frame)
+                    if len(batch) >= self.hash_batch_size:
+                        frame_count = self.save_new_frames(batch, kept_hashes, frames_dir, frame_count, encoder)
+                        batch = []
+
+            frame_count = self.save_new_frames(batch, kept_hashes, frames_dir, frame_count, encoder)
+        self.driver.record_log('info', f"Kept {frame_count} of {frame_index} frames ({sampled - frame_count} duplicates skipped).")
+
+        report = encoder.summary()
+        report['first_frame_seconds'] = first_frame_seconds
+        report['extract_seconds'] = round(time.monotonic() - start, 3)
+        self.encoding_reports[frames_dir] = report
+        if 'bytes_saved' in report:
+            self.driver.record_log('info', f"Wrote {report['bytes_written']} bytes of frames, saving {report['bytes_saved']} bytes over the default JPEG settings.")
+        else:
+            self.driver.record_log('info', f"Wrote {report['bytes_written']} bytes of frames.")
         video_file.release()
         os.remove(os.path.abspath(video_path))
         return frames_dir
@@ -138,14 +723,77 @@ class VideoFrameExtractor:
 
         if videos:
             self.driver.record_log('info', "Fetched new videos successfully.")
+            if self.process_workers > 0:
+                self.handle_videos_in_processes(videos)
+                return
+            if self.pipelined:
+                self.handle_videos_pipelined(videos)
+                return
             for video in videos:
                 try:
-                    video_path = self.download_video(video)
-                    frames_dir = self.extract_frames(video_path)
-                    self.remove_similar_frames(frames_dir)
+                    frames_dir = self.ingest_video(video)
                     self.upload_frames(frames_dir, video['photos_group_id'])
                     self.mark_video_as_done(video)
                 except Exception as e:
                     self.driver.record_log('error', f"Failed to process video {video.get('id', 'unknown')}: {e}")
         else:
-            self.driver.record_log('info', "No new videos.")
\ No newline at end of file
+            self.driver.record_log('info', "No new videos.")
+
+    def handle_videos_pipelined(self, videos: List[Dict[str, Any]]) -> None:
+        """
+        Processes videos through concurrent download, extract, upload and mark-done stages.
+
+        Each stage has its own workers and a bounded queue in front of it, so the frames of one video can be
+        uploading while the next one is being decoded, and a slow stage holds back the stages feeding it.
+
+        :param videos: The videos returned by the backend.
+        """
+        def download(job):
+            job['video_path'] = self.download_video(job['video'])
+            return job
+
+        def extract(job):
+            frames_dir = self.extract_frames(job['video_path'], job['video']['photos_group_id'])
+            if not frames_dir:
+                raise ValueError("Can't read video.")
+            job['frames_dir'] = frames_dir
+            return job
+
+        def ingest(job):
+            job['frames_dir'] = self.ingest_video(job['video'])
+            return job
+
+        def upload(job):
+            self.upload_frames(job['frames_dir'], job['video']['photos_group_id'])
+            return job
+
+        def done(job):
+            self.mark_video_as_done(job['video'])
+
+        def on_error(stage, job, e):
+            self.driver.record_log('error', f"Failed to process video {job['video'].get('id', 'unknown')} at the {stage} stage: {e}")
+
+        if self.streaming_decode:
+            # Downloading and decoding overlap inside a single stage
+            functions = [('extract', ingest), ('upload', upload), ('done', done)]
+        else:
+            functions = [('download', download), ('extract', extract), ('upload', upload), ('done', done)]
+        stages = [(name, function, self.stage_workers[name]) for name, function in functions]
+        Pipeline(stages, self.queue_size, on_error).run({'video': video} for video in videos)
+
+    def handle_videos_in_processes(self, videos: List[Dict[str, Any]]) -> None:
+        """
+        Processes videos in a pool of worker processes, marking each one as done as soon as its job finishes.
+
+        :param videos: The videos returned by the backend.
+        """
+        initargs = (type(self.driver), self.driver.url, self.driver.options, self.options)
+        with ProcessPoolExecutor(max_workers=self.process_workers, initializer=init_worker, initargs=initargs) as executor:
+            futures = {executor.submit(process_video, video): video for video in videos}
+            for future in as_completed(futures):
+                video = futures[future]
+                try:
+                    future.result()
+                    self.mark_video_as_done(video)
+                except Exception as e:
+                    self.driver.record_log('error', f"Failed to process video {video.get('id', 'unknown')}: {e}")
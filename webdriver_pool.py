@@ -0,0 +1,103 @@
+import atexit
+from collections import OrderedDict
+from typing import Any, Dict
+
+
+class WebDriverPool:
+    def __init__(self, driver, max_size: int = 2) -> None:
+        """
+        Initialize a pool of warm WebDriver sessions keyed by account ID.
+
+        Switching to an account whose Chrome is still open and responsive reuses it, without a new launch or
+        login. Once max_size sessions are open, the least recently used one is quit to make room. Sessions are
+        kept across phases and iterations and quit at interpreter exit.
+
+        :param driver: An instance of the Driver class, whose start_driver launches new sessions.
+        :param max_size: Maximum number of Chrome sessions kept open.
+        """
+        self.driver = driver
+        self.max_size = max(1, max_size)
+        self.sessions: "OrderedDict[Any, Any]" = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'unhealthy': 0}
+        atexit.register(self.close)
+
+    def _count(self, event: str) -> None:
+        self.stats[event] += 1
+        self.driver.metrics.inc('fmap_webdriver_pool_events', event=event)
+
+    @staticmethod
+    def is_healthy(web_driver) -> bool:
+        """
+        Checks that a WebDriver session still answers, with a command that doesn't touch the page.
+
+        :param web_driver: The WebDriver.
+        :return: Whether the session can be reused.
+        """
+        try:
+            return bool(web_driver.session_id) and bool(web_driver.window_handles)
+        except Exception:
+            return False
+
+    def _quit(self, web_driver) -> None:
+        try:
+            web_driver.quit()
+        except Exception as e:
+            self.driver.record_log('error', f"Error stopping a pooled WebDriver: {e}")
+
+    def acquire(self, account: Dict[str, Any]) -> bool:
+        """
+        Makes account the driver's current account, with its pooled WebDriver or a new one.
+
+        Calling it for the current account checks that its WebDriver still answers and replaces it otherwise.
+
+        :param account: The account, as returned by the backend.
+        :return: True if a new WebDriver was started and the caller must log in, False if a warm one was reused.
+        """
+        account_id = account['id']
+        switching = self.driver.currentAccount != account
+        web_driver = self.sessions.pop(account_id, None)
+        if web_driver is not None:
+            if self.is_healthy(web_driver):
+                self.sessions[account_id] = web_driver
+                self.driver.currentAccount = account
+                self.driver.webDriver = web_driver
+                # Staying on the current account is not a pool hit
+                if switching:
+                    self._count('hits')
+                    self.driver.record_log('info', f"Reusing the warm WebDriver of account {account_id}.")
+                return False
+            self._count('unhealthy')
+            self.driver.record_log('info', f"Pooled WebDriver of account {account_id} stopped responding, restarting it.")
+            self._quit(web_driver)
+
+        self._count('misses')
+        while len(self.sessions) >= self.max_size:
+            evicted_id, evicted = self.sessions.popitem(last=False)
+            self._count('evictions')
+            self.driver.record_log('info', f"Evicting the WebDriver of account {evicted_id} from the pool.")
+            self._quit(evicted)
+
+        self.driver.currentAccount = account
+        self.driver.webDriver = None
+        self.driver.start_driver()
+        self.sessions[account_id] = self.driver.webDriver
+        return True
+
+    def discard(self, account_id: Any) -> None:
+        """
+        Quits and forgets the WebDriver of an account, for instance after it was logged out or blocked.
+
+        :param account_id: The ID of the account.
+        """
+        web_driver = self.sessions.pop(account_id, None)
+        if web_driver is not None:
+            self._quit(web_driver)
+            if self.driver.webDriver is web_driver:
+                self.driver.webDriver = None
+
+    def close(self) -> None:
+        """Quits every pooled WebDriver."""
+        while self.sessions:
+            _, web_driver = self.sessions.popitem()
+            self._quit(web_driver)
+        self.driver.webDriver = None